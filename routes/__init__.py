@@ -1,6 +1,9 @@
 """Provides common classes and functions most users will want access to."""
 import threading
 
+# Kept in step with setup.py
+__version__ = '2.5.1'
+
 
 class _RequestConfig(object):
     """
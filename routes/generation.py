@@ -0,0 +1,242 @@
+"""Route index and URL builders used by the Mapper during URL generation
+
+Generating a URL starts from the routes that could produce the
+requested controller and action. A route hardcoding a controller or an
+action only produces that one, and a route that doesn't can produce any.
+
+"""
+import six
+from six.moves.urllib import parse as urlparse
+
+from routes.util import _url_quote as url_quote, _str_encode, as_unicode
+
+
+class GenerationIndex(object):
+    """Finds the routes that can generate a URL for a controller and
+    action
+
+    Routes are kept in four layers, by what they hardcode: both the
+    controller and the action, only the controller, only the action, or
+    neither. Looking up a controller and action merges the matching
+    entry of every layer back into connect order, so the index grows
+    with the number of routes instead of the number of controllers
+    times the number of actions.
+
+    The merged lists are cached per controller and action, together
+    with a dict of the orders ``Mapper.warmup()`` sorts them in for the
+    keys of named routes. The
+    controllers and actions only the wildcard layer has routes for
+    share the entry for ``None``.
+
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.controllers = {}
+        self.actions = {}
+        self.wildcard = []
+        self.cells = {}
+        self.count = 0
+
+    def add(self, route):
+        """Add a route, after every route added before"""
+        entry = (self.count, route)
+        self.count += 1
+        controller = action = None
+        if 'controller' in route.hardcoded:
+            controller = route.defaults['controller']
+        if 'action' in route.hardcoded:
+            action = six.text_type(route.defaults['action'])
+        if controller is not None and action is not None:
+            self.exact.setdefault((controller, action), []).append(entry)
+        elif controller is not None:
+            self.controllers.setdefault(controller, []).append(entry)
+        elif action is not None:
+            self.actions.setdefault(action, []).append(entry)
+        else:
+            self.wildcard.append(entry)
+        # Readers holding the old cells keep using them
+        self.cells = {}
+
+    def key(self, controller, action):
+        """Return the key of the routes for a controller and action,
+        with ``None`` for the ones only the wildcard layer has routes
+        for"""
+        if (controller, action) in self.exact:
+            return (controller, action)
+        if controller not in self.controllers:
+            controller = None
+        if action not in self.actions:
+            action = None
+        return (controller, action)
+
+    def routes(self, key):
+        """Return the list of routes for a key made by :meth:`key`, in
+        connect order"""
+        controller, action = key
+        entries = self.wildcard + self.controllers.get(controller, []) + \
+            self.actions.get(action, []) + self.exact.get(key, [])
+        # Positions are unique, so routes are never compared
+        entries.sort()
+        return [route for position, route in entries]
+
+    def lookup(self, controller, action):
+        """Return the cached ``(routes, sortcache)`` entry for a
+        controller and action"""
+        key = self.key(controller, action)
+        cells = self.cells
+        cell = cells.get(key)
+        if cell is None:
+            cell = cells.setdefault(key, (self.routes(key), {}))
+        return cell
+
+    def stats(self):
+        """Return the number of routes held by each layer, and the
+        number of merged lists cached"""
+        return dict(
+            exact=sum(len(routes) for routes in six.itervalues(self.exact)),
+            controller=sum(len(routes) for routes
+                           in six.itervalues(self.controllers)),
+            action=sum(len(routes) for routes
+                       in six.itervalues(self.actions)),
+            wildcard=len(self.wildcard),
+            cached=len(self.cells))
+
+
+def _quote_value(value, dot, encoding):
+    """Quote a route path variable the way ``Route.generate`` does"""
+    if type(value) in six.integer_types and not dot:
+        # Digits and '-' are never quoted
+        return str(value)
+    if not dot:
+        return url_quote(as_unicode(value, encoding), encoding)
+    if value:
+        return url_quote('.' + as_unicode(value, encoding), encoding)
+    return '%s' % (value,)
+
+
+class URLBuilder(object):
+    """Generates the URLs of one non-minimized route
+
+    The route path is split once into its literal parts and the slots
+    its variables fill, the defaults of the variables are quoted up
+    front, and the keys that must equal their defaults are looked up
+    by name. Generating a URL then only handles the keyword arguments
+    it's called with, and gives the same URL ``Mapper.generate`` gives
+    for the route alone. It returns None instead whenever that would
+    fail, or when a value needs the generic path, so the caller can
+    fall back to ``Mapper.generate``.
+
+    ``explicit`` is the mapper's option, which decides the controller
+    and action used when neither the route nor the call gives them.
+
+    """
+    __slots__ = ('route', 'parts', 'slots', 'fixed', 'hardcoded', 'reqs',
+                 'defaults', 'maxkeys')
+
+    def __init__(self, route, explicit=False):
+        self.route = route
+        encoding = route.encoding
+        defaults = route.defaults.copy()
+        if not explicit:
+            defaults.setdefault('controller', 'content')
+            defaults.setdefault('action', 'index')
+        self.defaults = defaults
+        self.maxkeys = route.maxkeys
+        # Keys that aren't in the path must equal their default
+        self.fixed = dict((key, route.make_unicode(route.defaults[key]))
+                          for key in route.maxkeys - route.minkeys)
+        self.hardcoded = dict((key, route.defaults[key])
+                              for key in route.hardcoded
+                              if not callable(route.defaults[key]))
+        self.reqs = tuple(route.reqs)
+        parts = []
+        slots = []
+        for part in route.routelist:
+            if isinstance(part, dict):
+                key = part['name']
+                dot = key in route.dotkeys
+                default = defaults.get(key)
+                if default is None and dot:
+                    default = ''
+                if default is not None:
+                    default = _quote_value(default, dot, encoding)
+                slots.append((len(parts), key, dot, default))
+                parts.append(None)
+            else:
+                parts.append(part)
+        self.parts = parts
+        self.slots = slots
+
+    def __call__(self, kargs, script_name='', prefix=None,
+                 append_slash=False):
+        """Return the URL for ``kargs``, or None"""
+        route = self.route
+        encoding = route.encoding
+        fixed = self.fixed
+        maxkeys = self.maxkeys
+        extras = None
+        for key in kargs:
+            if key in fixed:
+                value = kargs[key]
+                if route.make_unicode(value) != fixed[key]:
+                    return None
+                if value and key in self.hardcoded and \
+                        as_unicode(value, encoding) != self.hardcoded[key]:
+                    return None
+            elif key not in maxkeys and key != 'controller' and \
+                    key != 'action':
+                if extras is None:
+                    extras = []
+                extras.append(key)
+
+        for key in self.reqs:
+            value = kargs[key] if key in kargs else self.defaults.get(key)
+            if value and not route.req_regs[key].match(
+                    route.make_unicode(value)):
+                return None
+
+        # Every slot is checked before any value is quoted, as the
+        # generic path doesn't quote values for a route it can't use
+        for index, key, dot, default in self.slots:
+            if key in kargs:
+                if kargs[key] is None and not dot:
+                    return None
+            elif default is None:
+                return None
+
+        pieces = self.parts[:]
+        try:
+            for index, key, dot, default in self.slots:
+                if key not in kargs:
+                    pieces[index] = default
+                elif kargs[key] is not None:
+                    pieces[index] = _quote_value(kargs[key], dot, encoding)
+                else:
+                    pieces[index] = ''
+        except (TypeError, ValueError):
+            return None
+        url = ''.join(pieces)
+
+        if not url.startswith('/'):
+            url = '/' + url
+        if append_slash and not url.endswith('/'):
+            url += '/'
+        if extras:
+            fragments = []
+            for key in extras:
+                value = kargs[key]
+                if isinstance(value, (tuple, list)):
+                    for item in value:
+                        item = as_unicode(item, encoding)
+                        fragments.append((key, _str_encode(item, encoding)))
+                else:
+                    value = as_unicode(value, encoding)
+                    fragments.append((key, _str_encode(value, encoding)))
+            if fragments:
+                url += '?' + urlparse.urlencode(fragments)
+        if prefix:
+            url = prefix + url
+        if not route.absolute:
+            url = script_name + url
+        return str(url)
@@ -1,19 +1,41 @@
 """Mapper and Sub-Mapper"""
+import bisect
 import collections
-import itertools as it
+import functools
+import gc
+import hashlib
+import json
+import os
 import re
+import sys
+import tempfile
 import threading
+import time
 
 import six
 
-from routes import request_config
+from routes import request_config, __version__
 from routes.util import (
     controller_scan,
     RoutesException,
-    as_unicode
+    as_unicode,
+    _special_keys
 )
 from routes.route import Route
+from routes.generation import GenerationIndex, URLBuilder
+from routes.matching import (
+    CombinedRegexpIndex,
+    MasterRegexps,
+    first_segment,
+    match_engines
+)
+
 
+# Literal route table entries not worked out yet, with lazy regexps
+_PENDING = object()
+
+# Bumped whenever the format of the saved tables changes
+_TABLE_CACHE_VERSION = 3
 
 COLLECTION_ACTIONS = ['index', 'create', 'new']
 MEMBER_ACTIONS = ['show', 'update', 'delete', 'edit']
@@ -29,18 +51,35 @@ def strip_slashes(name):
 
 
 class LRUCache:
+    """An unsynchronized least recently used cache
+
+    The mapper caches URLs with :class:`ClockCache`. This class is only
+    kept for backward compatibility, for code that imports it from here.
+
+    """
+
     def __init__(self, capacity):
         self.capacity = capacity
         self.cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
 
     def get(self, key, defvalue):
         try:
             value = self.cache.pop(key)
             self.cache[key] = value
+            self.hits += 1
             return value
         except KeyError:
+            self.misses += 1
             return defvalue
 
+    def clear(self):
+        self.cache.clear()
+
+    def __len__(self):
+        return len(self.cache)
+
     def put(self, key, value):
         try:
             self.cache.pop(key)
@@ -50,6 +89,241 @@ class LRUCache:
         self.cache[key] = value
 
 
+def _deep_size(obj):
+    """Return the size of an object with the items of the tuples,
+    lists, sets and dicts it holds
+
+    Types are left out, they're shared by every entry.
+
+    """
+    if isinstance(obj, type):
+        return 0
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in six.iteritems(obj):
+            size += _deep_size(key) + _deep_size(value)
+    elif isinstance(obj, (tuple, list, set, frozenset)):
+        for item in obj:
+            size += _deep_size(item)
+    return size
+
+
+def _entry_size(key, value):
+    """Return the number of bytes a cache entry is counted as"""
+    return _deep_size(key) + _deep_size(value)
+
+
+class ClockCache(object):
+    """A bounded cache that threads can share, evicting entries with
+    the CLOCK approximation of LRU
+
+    Looking a key up takes no lock: it only reads the dict and marks the
+    entry as recently used. Adding a key takes a lock and, when the
+    cache is over its limits, sweeps the keys from the oldest, giving
+    the entries used since the last sweep a second chance and evicting
+    the others.
+
+    ``capacity`` bounds the number of entries and ``max_bytes``, when
+    set, the total size of the keys and values as measured by
+    ``sys.getsizeof``, counting the items of the tuples, lists, sets and
+    dicts they hold too; a value bigger than that isn't cached. Entries
+    older than ``ttl`` seconds, when set, are ignored, and evicted
+    without a second chance.
+
+    The ``hits``, ``misses``, ``evictions`` and ``bytes`` counters can
+    be read directly or with ``stats()``. Lookups don't lock them, so
+    concurrent lookups may undercount ``hits`` and ``misses``.
+
+    """
+
+    def __init__(self, capacity, max_bytes=None, ttl=None):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes = 0
+        # key -> [value, used since the last sweep, size, expiry time]
+        self._entries = {}
+        # Keys from the oldest, the next one the sweep looks at
+        self._ring = collections.deque()
+        self._lock = threading.Lock()
+
+    def get(self, key, defvalue):
+        entry = self._entries.get(key)
+        if entry is None or \
+                entry[3] is not None and entry[3] < time.time():
+            self.misses += 1
+            return defvalue
+        entry[1] = True
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key, value):
+        size = _entry_size(key, value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        expires = None
+        if self.ttl is not None:
+            expires = time.time() + self.ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.bytes += size - entry[2]
+                entry[:] = [value, True, size, expires]
+            else:
+                self._entries[key] = [value, False, size, expires]
+                self._ring.append(key)
+                self.bytes += size
+            self._sweep()
+
+    def _sweep(self):
+        """Evict entries until the cache is within its limits"""
+        entries = self._entries
+        ring = self._ring
+        max_bytes = self.max_bytes
+        now = time.time() if self.ttl is not None else None
+        while len(entries) > self.capacity or \
+                max_bytes is not None and self.bytes > max_bytes:
+            key = ring.popleft()
+            entry = entries[key]
+            if entry[1] and (now is None or entry[3] >= now):
+                # Used since the last sweep, so it gets a second chance
+                entry[1] = False
+                ring.append(key)
+                continue
+            del entries[key]
+            self.bytes -= entry[2]
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+            self._ring = collections.deque()
+            self.bytes = 0
+
+    def stats(self):
+        """Return a dict of the cache counters and size"""
+        return dict(hits=self.hits, misses=self.misses,
+                    evictions=self.evictions, entries=len(self._entries),
+                    bytes=self.bytes)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Values whose equality decides the URL generated from them, once the
+# type is part of the key: True == 1, but they're generated differently
+_scalar_types = frozenset(six.string_types + six.integer_types +
+                          (six.text_type, six.binary_type, float, bool,
+                           type(None)))
+
+
+def _url_cache_key(script_name, args, kargs):
+    """Return the URL cache key of a ``generate`` call
+
+    The keyword arguments are sorted by name, so the order they're
+    passed in doesn't matter. Scalar values are kept as they are, with
+    the types of all the values, other values are keyed by their
+    ``repr``.
+
+    """
+    items = sorted(six.iteritems(kargs))
+    kinds = tuple([type(value) for name, value in items])
+    if not _scalar_types.issuperset(kinds):
+        items = [(name, value if type(value) in _scalar_types
+                  else repr(value)) for name, value in items]
+    if args:
+        try:
+            hash(args)
+        except TypeError:
+            args = repr(args)
+    return (script_name, args, tuple(items), kinds)
+
+
+class _RouteRank(object):
+    """The key counts a route is sorted by to generate a URL from
+    ``keys``, worked out once per route instead of once per comparison"""
+    __slots__ = ('lendiff', 'common', 'keylen')
+
+    def __init__(self, route, keys):
+        maxkeys = route.maxkeys
+        self.common = len(keys & maxkeys)
+        self.keylen = len(maxkeys)
+        self.lendiff = len(keys) + self.keylen - 2 * self.common
+
+    def __lt__(self, other):
+        # The comparisons routes were always sorted with. They don't
+        # make a total order, so sorting by a tuple of the counts would
+        # pick another route in some cases.
+        if not self.lendiff:
+            return other.lendiff != 0
+        if not other.lendiff:
+            return False
+        if self.lendiff < other.lendiff:
+            return True
+        if self.common == other.common:
+            return self.keylen < other.keylen
+        return other.common < self.common
+
+
+def _sort_routes(routes, keys):
+    """Return the routes that can generate a URL from ``keys``, best
+    match first
+
+    Routes matching ``keys`` exactly come first, then the ones
+    differing by fewer keys, then the ones sharing more keys with it,
+    the sort keeping connect order otherwise.
+
+    """
+    keylist = [route for route in routes if route._required_keys <= keys]
+    keylist.sort(key=functools.partial(_RouteRank, keys=keys))
+    return keylist
+
+
+# The most route lists the sorted routes are cached for, by the key set
+# they're sorted for. The ones warmup() caches for named routes are kept
+# apart, in the generation index, and never evicted.
+_sortcache_size = 1600
+
+
+class _RouteTables(object):
+    """The matching and generation tables derived from the connected
+    routes
+
+    Removing a route builds a new instance and swaps it in, so a match
+    or generate call keeps using the tables it started with.
+
+    """
+    __slots__ = ('clist', 'engine', 'match_index', 'method_indexes',
+                 'any_method_index', 'literal_routes', 'literal_keys',
+                 'first_segments', 'first_partials', 'function_routes',
+                 'pending_master', 'master_regexps', 'gen_index',
+                 'url_builders')
+
+    def __init__(self):
+        self.clist = None
+        self.engine = None
+        self.match_index = None
+        self.method_indexes = None
+        self.any_method_index = None
+        # Routes to try for each literal route path
+        self.literal_routes = None
+        self.literal_keys = None
+        # First segments a matching URL can start with
+        self.first_segments = None
+        self.first_partials = None
+        self.function_routes = False
+        # Compiled by a background thread with lazy regexps
+        self.pending_master = None
+        self.master_regexps = None
+        # Routes to try for each controller and action
+        self.gen_index = None
+        # URL builders of the named routes, by name
+        self.url_builders = None
+
+
 class SubMapperParent(object):
     """Base class for Mapper and SubMapper, both of which may be the parent
     of SubMapper objects
@@ -333,7 +607,365 @@ def _kwargs_with_conditions(kwargs, method):
         return kwargs
 
 
-class Mapper(SubMapperParent):
+def _route_methods(route):
+    """Return the request methods a route is restricted to, if any"""
+    if route.conditions and 'method' in route.conditions:
+        return route.conditions['method']
+    return None
+
+
+class _TableReader(object):
+    """URL matching and generation with a _RouteTables object, shared by
+    the Mapper and its compiled snapshots"""
+
+    def _literal_candidates(self, url, index):
+        """Return the routes whose regexp matches a literal route's
+        path, in the order they're tried"""
+        return tuple(route for route in index.candidates(url)
+                     if route.regmatch.match(url))
+
+    def _sorted_routes(self, keylist, sortcache, keys):
+        """Return the routes of ``keylist`` in the order they're tried
+        to generate a URL from ``keys``
+
+        ``sortcache`` holds the orders warmup() worked out, which are
+        only read here. The others are kept in the bounded
+        ``_sortcache``, so generating never writes to the dicts of the
+        generation index.
+
+        """
+        cachelist = sortcache.get(keys)
+        if cachelist is not None:
+            return cachelist
+        cachekey = (id(keylist), keys)
+        cached = self._sortcache.get(cachekey, None)
+        # The id of an evicted route list can be reused
+        if cached is None or cached[0] is not keylist:
+            cached = (keylist, _sort_routes(keylist, keys))
+            self._sortcache.put(cachekey, cached)
+        return cached[1]
+
+    def _match_tables(self, tables, url, environ, cache, miss_cache):
+        """Match a URL with ``tables``, returning the match dict, route
+        and match log
+
+        ``cache`` and ``miss_cache`` are the caches of matched and
+        unmatched URLs to use, or None.
+
+        """
+        matchlog = []
+        if cache is not None or miss_cache is not None:
+            method = environ.get('REQUEST_METHOD') if environ else None
+            host = environ.get('HTTP_HOST') \
+                if environ and self.sub_domains else None
+            cache_key = (url, method, host)
+            if cache is not None:
+                cached = cache.get(cache_key, None)
+                if cached is not None:
+                    return (cached[0].copy(), cached[1], matchlog)
+            if miss_cache is not None and miss_cache.get(cache_key, False):
+                return (None, None, matchlog)
+
+        if self.prefix:
+            if re.match(self._regprefix, url):
+                url = re.sub(self._regprefix, r'\1', url)
+                if not url:
+                    url = '/'
+            else:
+                return (None, None, matchlog)
+
+        match, route = self._match_routes(tables, url, environ, matchlog)
+        if route is not None:
+            if cache is not None and \
+                    not self._function_tried(tables, url, environ, route):
+                cache.put(cache_key, (match.copy(), route))
+        elif miss_cache is not None and \
+                not self._function_tried(tables, url, environ, None):
+            miss_cache.put(cache_key, True)
+        return (match, route, matchlog)
+
+    def _method_index(self, tables, environ):
+        """Return the candidate index for the request method"""
+        if environ and tables.method_indexes:
+            method = environ.get('REQUEST_METHOD')
+            if method is not None:
+                return tables.method_indexes.get(method,
+                                                 tables.any_method_index)
+        return tables.match_index
+
+    def _match_routes(self, tables, url, environ, matchlog):
+        """Try the candidate routes for a URL, returning the match dict
+        and route, or a tuple of Nones"""
+        sub_domains = self.sub_domains
+        sub_domains_ignore = self.sub_domains_ignore
+        domain_match = self.domain_match
+        debug = self.debug
+
+        literal_routes = tables.literal_routes.get(url)
+        if literal_routes is _PENDING:
+            literal_routes = tables.literal_routes[url] = \
+                self._literal_candidates(url, tables.match_index)
+        if literal_routes is not None:
+            # Every route that could match this URL is known up front
+            for route in literal_routes:
+                if route._literal:
+                    match = route.match_literal(environ, sub_domains,
+                                                sub_domains_ignore,
+                                                domain_match)
+                else:
+                    match = route.match(url, environ, sub_domains,
+                                        sub_domains_ignore, domain_match)
+                if debug:
+                    matchlog.append(dict(route=route, regexp=bool(match)))
+                if isinstance(match, dict) or match:
+                    return (match, route)
+            return (None, None)
+
+        # No route can match a URL with an unknown first segment
+        first_segments = tables.first_segments
+        if first_segments is not None and \
+                first_segment(url) not in first_segments and \
+                not any(url.startswith(partial)
+                        for partial in tables.first_partials):
+            return (None, None)
+
+        index = self._method_index(tables, environ)
+        if isinstance(index, CombinedRegexpIndex):
+            # The combined regexps reject invalid URLs themselves
+            return index.match(url, environ, sub_domains,
+                               sub_domains_ignore, domain_match,
+                               matchlog if debug else None)
+
+        # Check to see if its a valid url against the master regexps
+        # Done for faster invalid URL elimination. Lazy regexps match
+        # without them until they're compiled.
+        master = tables.master_regexps
+        if master is not None and not master.match(url):
+            return (None, None)
+
+        segments = url.count('/')
+        length = len(url)
+        for route in index.candidates(url):
+            if route.static:
+                if debug:
+                    matchlog.append(dict(route=route, static=True))
+                continue
+            if not route._min_segments <= segments <= route._max_segments \
+                    or length < route._min_length:
+                if debug:
+                    matchlog.append(dict(route=route, regexp=False,
+                                         skipped='bounds'))
+                continue
+            if route._required_literals and route._lacks_literals(url):
+                if debug:
+                    matchlog.append(dict(route=route, regexp=False,
+                                         skipped='literal'))
+                continue
+            match = route.match(url, environ, sub_domains, sub_domains_ignore,
+                                domain_match)
+            if debug:
+                matchlog.append(dict(route=route, regexp=bool(match)))
+            if isinstance(match, dict) or match:
+                return (match, route)
+        return (None, None)
+
+    def _function_tried(self, tables, url, environ, route):
+        """Whether a route with a function condition may have been tried
+        before ``route`` matched the URL, in which case the result
+        depends on more than the URL, method and host"""
+        if not tables.function_routes:
+            return False
+        candidates = tables.literal_routes.get(url)
+        if candidates is _PENDING:
+            candidates = self._literal_candidates(url, tables.match_index)
+        if candidates is None:
+            candidates = self._method_index(tables, environ).candidates(url)
+        for candidate in candidates:
+            if candidate.conditions and 'function' in candidate.conditions:
+                return True
+            if candidate is route:
+                break
+        return False
+
+    def _generate(self, tables, urlcache, script_name, args, kargs):
+        """Generate a URL with the generation hashes of ``tables``,
+        caching it in ``urlcache`` unless that's None"""
+        if self.append_slash:
+            kargs['_append_slash'] = True
+
+        if not self.explicit:
+            if 'controller' not in kargs:
+                kargs['controller'] = 'content'
+            if 'action' not in kargs:
+                kargs['action'] = 'index'
+
+        controller = kargs.get('controller', None)
+        action = kargs.get('action', None)
+
+        # Keyed by the SCRIPT_NAME too, which most URLs start with
+        if urlcache is not None:
+            cache_key = _url_cache_key(script_name, args, kargs)
+
+            # Check the url cache to see if it exists, use it if it does
+            val = urlcache.get(cache_key, self)
+            if val != self:
+                return val
+
+        controller = as_unicode(controller, self.encoding)
+        action = as_unicode(action, self.encoding)
+
+        (keylist, sortcache) = self._gen_routes(tables, controller, action)
+        if not keylist and not args:
+            return None
+
+        if args:
+            keylist = args
+        else:
+            keylist = self._sorted_routes(keylist, sortcache,
+                                          frozenset(kargs.keys()))
+
+        # Iterate through the keylist of sorted routes (or a single route if
+        # it was passed in explicitly for hardcoded named routes)
+        for route in keylist:
+            fail = False
+            for key in route.hardcoded:
+                kval = kargs.get(key)
+                if not kval:
+                    continue
+                kval = as_unicode(kval, self.encoding)
+                if kval != route.defaults[key] and \
+                        not callable(route.defaults[key]):
+                    fail = True
+                    break
+            if fail:
+                continue
+            path = route.generate(**kargs)
+            if path:
+                if self.prefix:
+                    path = self.prefix + path
+                external_static = route.static and route.external
+                if not route.absolute and not external_static:
+                    path = script_name + path
+                if urlcache is not None:
+                    urlcache.put(cache_key, str(path))
+                return str(path)
+            else:
+                continue
+        return None
+
+
+class CompiledMapper(_TableReader):
+    """A read-only snapshot of a Mapper's routes, made by
+    :meth:`Mapper.compile`
+
+    Every matching and generation table is built when the snapshot is
+    made, and matching or generating only writes to the snapshot's own
+    caches. Their lookups take no lock, and only adding an entry does,
+    so concurrent lookups may undercount their ``hits`` and ``misses``.
+    Any number of threads can share it.
+
+    The snapshot keeps the mapper options it was made with, and never
+    reads the mapper's thread-local ``environ``: pass the WSGI environ
+    to ``match`` and ``routematch``, and as ``_environ`` to
+    ``generate``. The ``Route`` objects are shared with the mapper, so
+    calling ``create_regs`` again with other controllers changes their
+    regexps for the snapshot too.
+
+    """
+
+    def __init__(self, mapper, tables):
+        self._tables = tables
+        self.prefix = mapper.prefix
+        self._regprefix = mapper._regprefix
+        self.sub_domains = mapper.sub_domains
+        self.sub_domains_ignore = list(mapper.sub_domains_ignore)
+        self.domain_match = mapper.domain_match
+        self.debug = mapper.debug
+        self.explicit = mapper.explicit
+        self.encoding = mapper.encoding
+        self.append_slash = mapper.append_slash
+        self.match_cache = self.miss_cache = self.urlcache = None
+        if mapper.match_cache_size:
+            self.match_cache = ClockCache(mapper.match_cache_size)
+        if mapper.miss_cache_size:
+            self.miss_cache = ClockCache(mapper.miss_cache_size)
+        if mapper.urlcache is not None:
+            self.urlcache = mapper._make_urlcache()
+        # Route lists for the controllers and actions, and route orders
+        # for the keys, that no named route uses
+        self._gencache = ClockCache(1600)
+        self._sortcache = ClockCache(_sortcache_size)
+
+    def _match(self, url, environ):
+        cache = miss_cache = None
+        if not self.debug:
+            cache = self.match_cache
+            miss_cache = self.miss_cache
+        return self._match_tables(self._tables, url, environ, cache,
+                                  miss_cache)
+
+    def match(self, url=None, environ=None):
+        """Match a URL, returning the match dict or None
+
+        Like :meth:`Mapper.match`.
+
+        """
+        if url is None and not environ:
+            raise RoutesException('URL or environ must be provided')
+
+        if url is None:
+            url = environ['PATH_INFO']
+
+        result = self._match(url, environ)
+        if self.debug:
+            return result[0], result[1], result[2]
+        if isinstance(result[0], dict) or result[0]:
+            return result[0]
+        return None
+
+    def routematch(self, url=None, environ=None):
+        """Match a URL, returning the match dict and route or None
+
+        Like :meth:`Mapper.routematch`.
+
+        """
+        if url is None and not environ:
+            raise RoutesException('URL or environ must be provided')
+
+        if url is None:
+            url = environ['PATH_INFO']
+        result = self._match(url, environ)
+        if self.debug:
+            return result[0], result[1], result[2]
+        if isinstance(result[0], dict) or result[0]:
+            return result[0], result[1]
+        return None
+
+    def generate(self, *args, **kargs):
+        """Generate a URL from a set of keywords, or return None
+
+        Like :meth:`Mapper.generate`. The ``SCRIPT_NAME`` is only read
+        from the ``_environ`` keyword argument.
+
+        """
+        environ = kargs.pop('_environ', None) or {}
+        script_name = environ.get('SCRIPT_NAME', '')
+        return self._generate(self._tables, self.urlcache, script_name,
+                              args, kargs)
+
+    def _gen_routes(self, tables, controller, action):
+        gen_index = tables.gen_index
+        key = gen_index.key(controller, action)
+        cell = gen_index.cells.get(key)
+        if cell is None:
+            cell = self._gencache.get(key, None)
+            if cell is None:
+                cell = (gen_index.routes(key), {})
+                self._gencache.put(key, cell)
+        return cell
+
+
+class Mapper(SubMapperParent, _TableReader):
     """Mapper handles URL generation and URL recognition in a web
     application.
 
@@ -411,14 +1043,85 @@ class Mapper(SubMapperParent):
             for the route being used *or* if they actually force url
             generation to use the route. Defaults to False.
 
+        ``match_engine``
+            The index used to find candidate routes during URL
+            matching. ``'prefix'`` probes the URL once for every
+            distinct static prefix length, ``'tree'`` walks a segment
+            tree of the static prefixes once. ``'combined'`` runs one
+            alternation of all route regexps and reads the winning
+            route from the last matched group. All of them try the
+            routes in the same order. Takes effect the next time the
+            regular expressions are created. Defaults to ``'prefix'``.
+
+        ``master_shard_size``
+            The largest number of routes compiled into one of the
+            master regexps used to reject invalid URLs. Routes are
+            grouped by the first segment of their static prefix, and
+            groups larger than this are split. ``master_shards`` shows
+            the resulting shards. Defaults to 500.
+
+        ``regex_backend``
+            The module used to compile the route, master and
+            requirement regexps, such as the third-party ``regex``
+            module or a binding to a linear-time engine. It needs an
+            ``re`` compatible ``compile`` function whose patterns
+            support named groups and keep their source in ``pattern``.
+            Takes effect the next time the
+            regular expressions are created. Defaults to ``re``.
+
+        ``lazy_regexps``
+            When True, each route's regexp is compiled the first time
+            the route is tried, instead of all of them when the regular
+            expressions are created. The master regexps are compiled
+            in a background thread and URLs are matched without them
+            until they're ready, or ``build_master_regexps`` can be
+            called to build them right away. Speeds up the start of
+            processes with many routes. Defaults to False.
+
+        ``table_cache``
+            A directory where the regexp sources and the literal route
+            table are saved as JSON when the regular expressions are
+            created, in a file named after a hash of the routes version,
+            the route definitions and the controller list. Processes
+            connecting the same routes load them from there instead of
+            building them again. Defaults to None, disabling the cache.
+
+        ``match_cache_size``
+            When set, the results of the last this many distinct URL,
+            request method and host (with ``sub_domains``) combinations
+            are cached. The cache is emptied whenever routes are
+            connected or the regular expressions are created, and
+            results depending on a ``function`` condition aren't cached.
+            ``match_cache`` holds the cache, with ``hits`` and
+            ``misses`` counters. Defaults to 0, disabling the cache.
+
+        ``miss_cache_size``
+            Like ``match_cache_size``, but remembers the URLs that
+            didn't match any route, so repeated misses are rejected with
+            a single lookup. ``miss_cache`` holds the cache. Defaults to
+            0, disabling the cache.
+
+        ``urlcache_size``, ``urlcache_bytes`` and ``urlcache_ttl``
+            The most URLs ``generate`` caches, the most bytes their keys
+            and values may take, and the seconds a URL stays cached.
+            They're applied when the generation hashes are created, on
+            the first ``generate``. ``urlcache`` holds the cache, a
+            ``ClockCache`` with ``hits``, ``misses``, ``evictions`` and
+            ``bytes`` counters. Default to 1600 URLs without a byte or
+            time limit; a size of 0 disables the cache.
+
         """
         self.matchlist = []
+        self._route_data = {}
         self.maxkeys = {}
         self.minkeys = {}
-        self.urlcache = LRUCache(1600)
+        self.urlcache_size = 1600
+        self.urlcache_bytes = None
+        self.urlcache_ttl = None
+        self.urlcache = self._make_urlcache()
         self._created_regs = False
         self._created_gens = False
-        self._master_regexp = None
+        self._tables = _RouteTables()
         self.prefix = None
         self.req_data = threading.local()
         self.directory = directory
@@ -436,7 +1139,18 @@ class Mapper(SubMapperParent):
         self.decode_errors = 'ignore'
         self.hardcode_names = True
         self.minimization = False
+        self.match_engine = 'prefix'
+        self.master_shard_size = 500
+        self.regex_backend = re
+        self.lazy_regexps = False
+        self.table_cache = None
+        self._master_thread = None
+        self.match_cache_size = 0
+        self.match_cache = None
+        self.miss_cache_size = 0
+        self.miss_cache = None
         self.create_regs_lock = threading.Lock()
+        self._sortcache = ClockCache(_sortcache_size)
         if register:
             config = request_config()
             config.mapper = self
@@ -463,6 +1177,21 @@ class Mapper(SubMapperParent):
                      for col in range(len(widths)))
             for row in table)
 
+    @property
+    def master_shards(self):
+        """A list of ``(first segment, number of routes)`` tuples, one
+        for every master regexp shard
+
+        A first segment of ``None`` marks the shards every URL is
+        checked against, holding routes whose path doesn't decide the
+        first segment of the URL, such as ``/{controller}``.
+
+        """
+        master = self._tables.master_regexps
+        if not self._created_regs or master is None:
+            return []
+        return master.stats()
+
     def _envget(self):
         try:
             return self.req_data.environ
@@ -556,6 +1285,7 @@ class Mapper(SubMapperParent):
         if '_minimize' not in kargs:
             kargs['_minimize'] = self.minimization
         route = self.make_route(*args, **kargs)
+        route._share_data(self._route_data)
 
         # Apply encoding and errors if its not the defaults and the route
         # didn't have one passed in.
@@ -564,14 +1294,31 @@ class Mapper(SubMapperParent):
             route.encoding = self.encoding
             route.decode_errors = self.decode_errors
 
+        self.create_regs_lock.acquire()
+        try:
+            self._connect_route(route, routename)
+        finally:
+            self.create_regs_lock.release()
+
+    def _connect_route(self, route, routename):
+        """Add a new route to the matchlist and the tables made so far"""
         if not route.static:
             self.matchlist.append(route)
 
         if routename:
             self._routenames[routename] = route
             route.name = routename
+            if self._created_gens:
+                self._tables.url_builders[routename] = \
+                    self._make_url_builder(route)
         if route.static:
             return
+        if self.match_cache is not None:
+            self.match_cache.clear()
+        if self.miss_cache is not None:
+            self.miss_cache.clear()
+        if self.urlcache is not None:
+            self.urlcache.clear()
         exists = False
         for key in self.maxkeys:
             if key == route.maxkeys:
@@ -580,49 +1327,144 @@ class Mapper(SubMapperParent):
                 break
         if not exists:
             self.maxkeys[route.maxkeys] = [route]
-        self._created_gens = False
+        # Keep the tables up to date instead of building them again.
+        # Every step leaves tables that match and generate either with
+        # or without the new route.
+        if self._created_gens:
+            self._tables.gen_index.add(route)
+        if self._created_regs:
+            self._add_route_regs(self._tables, route)
+
+    def remove_route(self, name_or_route):
+        """Remove a connected route, given its name or the Route object
+
+        Raises a RoutesException when no such route is connected. The
+        matching and generation tables are built again for the other
+        routes and swapped in with a single assignment, so match and
+        generate calls in other threads keep using the tables they
+        started with, without taking a lock.
 
-    def _create_gens(self):
-        """Create the generation hashes for route lookups"""
-        # Use keys temporailly to assemble the list to avoid excessive
-        # list iteration testing with "in"
-        controllerlist = {}
-        actionlist = {}
+        .. code-block:: python
 
-        # Assemble all the hardcoded/defaulted actions/controllers used
-        for route in self.matchlist:
+            m.connect('tenant_home', '/acme', controller='acme')
+            m.remove_route('tenant_home')
+
+        """
+        self.create_regs_lock.acquire()
+        try:
+            if isinstance(name_or_route, six.string_types):
+                route = self._routenames.get(name_or_route)
+                if route is None:
+                    raise RoutesException("No route named %r" %
+                                          name_or_route)
+            else:
+                route = name_or_route
+                if route not in self.matchlist and \
+                        route not in list(self._routenames.values()):
+                    raise RoutesException("Route %r is not connected" %
+                                          route)
+            self._routenames = dict(
+                (name, other) for name, other
+                in six.iteritems(self._routenames) if other is not route)
             if route.static:
-                continue
-            if 'controller' in route.defaults:
-                controllerlist[route.defaults['controller']] = True
-            if 'action' in route.defaults:
-                actionlist[route.defaults['action']] = True
-
-        # Setup the lists of all controllers/actions we'll add each route
-        # to. We include the '*' in the case that a generate contains a
-        # controller/action that has no hardcodes
-        controllerlist = list(controllerlist.keys()) + ['*']
-        actionlist = list(actionlist.keys()) + ['*']
-
-        # Go through our list again, assemble the controllers/actions we'll
-        # add each route to. If its hardcoded, we only add it to that dict key.
-        # Otherwise we add it to every hardcode since it can be changed.
-        gendict = {}  # Our generated two-deep hash
+                return
+            self.matchlist = [other for other in self.matchlist
+                              if other is not route]
+            maxkeys = {}
+            for other in self.matchlist:
+                maxkeys.setdefault(other.maxkeys, []).append(other)
+            self.maxkeys = maxkeys
+
+            old = self._tables
+            tables = _RouteTables()
+            if self._created_regs:
+                # The regexps of the other routes are still valid
+                self._make_regs(tables, old.clist, make_regexps=False)
+            if self._created_gens and tables.gen_index is None:
+                self._make_gens(tables)
+            self._tables = tables
+            if tables.pending_master is not None and \
+                    tables.master_regexps is None:
+                self._start_master_thread(tables.pending_master)
+
+            # In-flight requests may still fill the old caches
+            self.match_cache = self._reset_cache(None, self.match_cache_size)
+            self.miss_cache = self._reset_cache(None, self.miss_cache_size)
+            if isinstance(self.urlcache, ClockCache):
+                # Made with the current urlcache_* options
+                self.urlcache = self._make_urlcache()
+            elif self.urlcache is not None:
+                # A cache the application set can't be replaced
+                self.urlcache.clear()
+        finally:
+            self.create_regs_lock.release()
+
+    def _create_gens(self):
+        """Create the generation index for route lookups"""
+        self.create_regs_lock.acquire()
+        try:
+            if not self._created_gens:
+                self._make_gens(self._tables)
+                self._created_gens = True
+                self._apply_urlcache_options()
+        finally:
+            self.create_regs_lock.release()
+
+    def _apply_urlcache_options(self):
+        """Replace the URL cache when the ``urlcache_*`` options changed
+        since it was made, called whenever the generation tables are
+        built"""
+        urlcache = self.urlcache
+        if isinstance(urlcache, ClockCache) and \
+                (urlcache.capacity, urlcache.max_bytes,
+                 urlcache.ttl) != (self.urlcache_size, self.urlcache_bytes,
+                                   self.urlcache_ttl):
+            self.urlcache = self._make_urlcache()
+
+    def _make_gens(self, tables):
+        """Make the generation index and URL builders of ``tables``"""
+        gen_index = GenerationIndex()
         for route in self.matchlist:
-            if route.static:
-                continue
-            clist = controllerlist
-            alist = actionlist
-            if 'controller' in route.hardcoded:
-                clist = [route.defaults['controller']]
-            if 'action' in route.hardcoded:
-                alist = [six.text_type(route.defaults['action'])]
-            for controller in clist:
-                for action in alist:
-                    actiondict = gendict.setdefault(controller, {})
-                    actiondict.setdefault(action, ([], {}))[0].append(route)
-        self._gendict = gendict
-        self._created_gens = True
+            if not route.static:
+                gen_index.add(route)
+        tables.url_builders = dict(
+            (name, self._make_url_builder(route))
+            for name, route in six.iteritems(self._routenames))
+        tables.gen_index = gen_index
+
+    def _make_url_builder(self, route):
+        """Return a URLBuilder for a named route, or None when its URLs
+        can only be made by ``generate``"""
+        if route.static or route.minimization or route.filter or \
+                not _special_keys.isdisjoint(route.defaults):
+            return None
+        return URLBuilder(route, self.explicit)
+
+    def _url_builder(self, name):
+        """Return the URL builder of a named route, or None when its URLs
+        have to be made by ``generate``"""
+        if not self.hardcode_names or self.sub_domains:
+            return None
+        if not self._created_gens:
+            self._create_gens()
+        builder = self._tables.url_builders.get(name)
+        if builder is None or builder.route is not self._routenames.get(name):
+            return None
+        return builder
+
+    def _build_url(self, name, kargs, script_name):
+        """Return the URL of a named route made by its URL builder, or
+        None when ``generate`` has to make it
+
+        Only used by URLGenerator, for the keyword arguments of a call
+        naming a route and none of the keys it handles itself. The
+        URL isn't cached, as building it costs less than the cache key.
+
+        """
+        builder = self._url_builder(name)
+        if builder is None:
+            return None
+        return builder(kargs, script_name, self.prefix, self.append_slash)
 
     def create_regs(self, *args, **kwargs):
         """Atomically creates regular expressions for all connected
@@ -646,39 +1488,521 @@ class Mapper(SubMapperParent):
             else:
                 clist = self.controller_scan
 
-        for key, val in six.iteritems(self.maxkeys):
-            for route in val:
-                route.makeregexp(clist)
-
-        regexps = []
-        prefix2routes = collections.defaultdict(list)
-        for route in self.matchlist:
-            if not route.static:
-                regexps.append(route.makeregexp(clist, include_names=False))
-                # Group the routes by static prefix
-                prefix = ''.join(it.takewhile(lambda p: isinstance(p, str),
-                                              route.routelist))
-                if route.minimization and not prefix.startswith('/'):
-                    prefix = '/' + prefix
-                prefix2routes[prefix.rstrip("/")].append(route)
-        self._prefix2routes = prefix2routes
-        # Keep track of all possible prefix lengths in decreasing order
-        self._prefix_lens = sorted(set(len(p) for p in prefix2routes),
-                                   reverse=True)
+        # The generation hashes don't depend on the regexps
+        old = self._tables
+        tables = _RouteTables()
+        tables.gen_index = old.gen_index
+        tables.url_builders = old.url_builders
+        self._make_regs(tables, clist)
+        self._tables = tables
+        self._created_gens = tables.gen_index is not None
+        if self._created_gens:
+            self._apply_urlcache_options()
+
+        # Save the master regexps
+        master = tables.pending_master
+        if master is not None and tables.master_regexps is None:
+            self._start_master_thread(master)
 
         # Create our regexp to strip the prefix
         if self.prefix:
             self._regprefix = re.compile(self.prefix + '(.*)')
 
-        # Save the master regexp
-        regexp = '|'.join(['(?:%s)' % x for x in regexps])
-        self._master_reg = regexp
-        try:
-            self._master_regexp = re.compile(regexp)
-        except OverflowError:
-            self._master_regexp = None
+        # Results of the old routes can't be trusted anymore
+        self.match_cache = self._reset_cache(self.match_cache,
+                                             self.match_cache_size)
+        self.miss_cache = self._reset_cache(self.miss_cache,
+                                            self.miss_cache_size)
         self._created_regs = True
 
+    def _make_regs(self, tables, clist, make_regexps=True, lazy=None):
+        """Make the matching tables of ``tables`` for the matchlist
+
+        ``make_regexps`` tells whether to make the regexps of the routes
+        too, rather than keep the ones made for ``clist`` already.
+        ``lazy`` defaults to ``lazy_regexps``.
+
+        """
+        backend = self.regex_backend
+        if lazy is None:
+            lazy = self.lazy_regexps
+        saved = table_path = None
+        if self.table_cache:
+            table_path = self._table_cache_path(clist)
+            saved = self._load_tables(table_path)
+        if saved is not None:
+            if make_regexps:
+                for route, (regexp, master_regexp) in zip(self.matchlist,
+                                                          saved['regexps']):
+                    route.set_regexp(regexp, backend, lazy)
+        elif make_regexps:
+            for key, val in six.iteritems(self.maxkeys):
+                for route in val:
+                    route.makeregexp(clist, backend=backend, lazy=lazy)
+
+        try:
+            engine = match_engines[self.match_engine]
+        except KeyError:
+            raise RoutesException("Unknown match engine: %r" %
+                                  self.match_engine)
+        combined = engine is CombinedRegexpIndex
+        if combined:
+            engine = functools.partial(CombinedRegexpIndex, backend)
+        tables.clist = clist
+        tables.engine = engine
+        tables.match_index = engine()
+        tables.method_indexes, tables.any_method_index = \
+            self._make_method_indexes(tables)
+
+        # The combined engine doesn't need a master regexp
+        if combined:
+            master = None
+        else:
+            master = MasterRegexps(self.master_shard_size, backend)
+        tables.pending_master = master
+
+        # Every matching URL starts with one of these first segments, or
+        # with the static prefix of a route that doesn't decide its
+        # first segment. A route without a static prefix can match any
+        # URL.
+        tables.first_segments = set()
+        tables.first_partials = ()
+        tables.function_routes = False
+
+        master_regexps = []
+        for position, route in enumerate(self.matchlist):
+            if route.static:
+                continue
+            if master is not None:
+                if saved is not None:
+                    master_regexp = saved['regexps'][position][1]
+                else:
+                    master_regexp = route.makeregexp(
+                        clist, include_names=False, backend=backend)
+                master_regexps.append(master_regexp)
+                master.add(route._first_segment, master_regexp)
+            self._index_route(tables, route, methods=False)
+
+        # Routes without variables are looked up by path. Each entry
+        # holds every route whose regexp matches that path, in the
+        # order they'd be tried, so an earlier dynamic route still wins
+        if saved is not None:
+            literal_routes = self._restore_literal_routes(
+                saved['literal_routes'])
+        else:
+            literal_routes = self._make_literal_routes(tables, lazy)
+        tables.literal_routes = literal_routes
+        tables.literal_keys = sorted(literal_routes)
+
+        if table_path is not None:
+            if tables.gen_index is None:
+                self._make_gens(tables)
+            if saved is None:
+                self._save_tables(tables, table_path, master_regexps)
+
+        # Lazy master regexps are compiled by a background thread once
+        # the tables are in use
+        if master is not None and not lazy:
+            master.compile()
+            tables.master_regexps = master
+
+    def _start_master_thread(self, master):
+        """Compile the master regexps in a background thread"""
+        self._master_thread = threading.Thread(
+            target=self.build_master_regexps, args=(master,))
+        self._master_thread.daemon = True
+        self._master_thread.start()
+
+    def _add_route_regs(self, tables, route):
+        """Make the regexps of a route appended to the matchlist and add
+        it to the matching tables"""
+        backend = self.regex_backend
+        route.makeregexp(tables.clist, backend=backend,
+                         lazy=self.lazy_regexps)
+        master = tables.pending_master
+        if master is not None:
+            # Compiled by the next match
+            master.add(route._first_segment,
+                       route.makeregexp(tables.clist, include_names=False,
+                                        backend=backend))
+        self._index_route(tables, route)
+        self._add_literal_route(tables, route)
+
+    def _make_method_indexes(self, tables):
+        """Return the candidate indexes for every request method named
+        by a route, and for other methods
+
+        Keeping a separate index per request method means routes that
+        can't accept the method are never tried. Methods that no route
+        names use the index of routes without a method list. Without
+        any method lists, there are no indexes and every request uses
+        the main index.
+
+        """
+        methods = set()
+        for route in self.matchlist:
+            allowed = _route_methods(route)
+            if isinstance(allowed, six.string_types):
+                methods.add(allowed)
+            elif allowed is not None:
+                methods.update(allowed)
+        method_indexes = dict((method, tables.engine()) for method in methods)
+        any_method_index = tables.engine()
+        if methods:
+            for route in self.matchlist:
+                if not route.static:
+                    self._index_methods(route, method_indexes,
+                                        any_method_index)
+        return method_indexes, any_method_index
+
+    def _index_methods(self, route, method_indexes, any_method_index):
+        """Add a route to the indexes of the methods it accepts"""
+        prefix = route._static_prefix
+        allowed = _route_methods(route)
+        if allowed is None or isinstance(allowed, six.string_types):
+            # A string matches any method it contains
+            any_method_index.add(prefix, route)
+        for method, method_index in six.iteritems(method_indexes):
+            if allowed is None or method in allowed:
+                method_index.add(prefix, route)
+
+    def _index_route(self, tables, route, methods=True):
+        """Add a route to the candidate indexes and the first segment
+        filter, its regexp must have been made already
+
+        ``methods`` tells whether to add it to the method indexes too,
+        which are made again when the route names a new method.
+
+        """
+        tables.match_index.add(route._static_prefix, route)
+        if methods:
+            allowed = _route_methods(route)
+            if isinstance(allowed, six.string_types):
+                allowed = [allowed]
+            if allowed is not None and \
+                    any(method not in tables.method_indexes
+                        for method in allowed):
+                # The route is in the matchlist already
+                tables.method_indexes, tables.any_method_index = \
+                    self._make_method_indexes(tables)
+            elif tables.method_indexes:
+                self._index_methods(route, tables.method_indexes,
+                                    tables.any_method_index)
+
+        if tables.first_segments is not None:
+            if route._first_segment is not None:
+                tables.first_segments.add(route._first_segment)
+            elif route._static_prefix:
+                if route._static_prefix not in tables.first_partials:
+                    tables.first_partials += (route._static_prefix,)
+            else:
+                tables.first_segments = tables.first_partials = None
+
+        if route.conditions and 'function' in route.conditions:
+            tables.function_routes = True
+
+    def warmup(self):
+        """Build every structure used for URL matching and generation
+        now, instead of on the first requests that need them
+
+        The regular expressions are created with ``controller_scan``
+        unless ``create_regs`` was called already. Every regexp is
+        compiled, even with ``lazy_regexps``, and the sorted route
+        lists used to generate each named route from its own keys are
+        cached.
+
+        """
+        if not self._created_regs and self.controller_scan:
+            self.create_regs()
+        if self._created_regs:
+            self._warm_regs(self._tables)
+            self.build_master_regexps()
+        if not self._created_gens:
+            self._create_gens()
+        self._warm_gens(self._tables)
+
+    def _warm_regs(self, tables):
+        """Compile every regexp and fill in the literal route table"""
+        for route in self.matchlist:
+            # Reading it compiles a lazy regexp
+            route.regmatch
+        literal_routes = tables.literal_routes
+        for key, routes in list(six.iteritems(literal_routes)):
+            if routes is _PENDING:
+                literal_routes[key] = self._literal_candidates(
+                    key, tables.match_index)
+        indexes = [tables.match_index, tables.any_method_index]
+        indexes.extend(six.itervalues(tables.method_indexes))
+        for index in indexes:
+            if isinstance(index, CombinedRegexpIndex) and \
+                    index.shards is None:
+                index.compile()
+
+    def _warm_gens(self, tables):
+        """Cache the sorted route lists used to generate each named
+        route from its own keys"""
+        gen_index = tables.gen_index
+        for route in six.itervalues(self._routenames):
+            if route.static:
+                continue
+            (keylist, sortcache) = gen_index.lookup(
+                as_unicode(route.defaults.get('controller'), self.encoding),
+                as_unicode(route.defaults.get('action'), self.encoding))
+            if not keylist:
+                continue
+            # The keys url_for passes for a name: the route defaults
+            # followed by its variables
+            kargs = route.defaults.copy()
+            kargs.update((key, None) for key in route.maxkeys)
+            if self.append_slash:
+                kargs['_append_slash'] = True
+            keys = frozenset(kargs)
+            if keys not in sortcache:
+                sortcache[keys] = _sort_routes(keylist, keys)
+
+    def compile(self):
+        """Return a :class:`CompiledMapper`, a read-only snapshot of the
+        connected routes that any number of threads can share
+
+        The regular expressions are created with ``controller_scan``
+        unless ``create_regs`` was called already. The snapshot gets its
+        own copy of every matching and generation table, built up front
+        with every regexp compiled, so connecting or removing routes
+        afterwards doesn't change it.
+
+        .. code-block:: python
+
+            compiled = m.compile()
+            compiled.match('/blog/view/3', environ)
+            compiled.generate(controller='blog', action='view', id=3)
+
+        """
+        if not self._created_regs and self.controller_scan:
+            self.create_regs()
+        elif not self._created_regs:
+            raise RoutesException("You must generate the regular expressions"
+                                  " before compiling.")
+        self.create_regs_lock.acquire()
+        try:
+            tables = _RouteTables()
+            self._make_regs(tables, self._tables.clist, make_regexps=False,
+                            lazy=False)
+            if tables.gen_index is None:
+                self._make_gens(tables)
+            self._warm_regs(tables)
+            if tables.master_regexps is None and \
+                    tables.pending_master is not None:
+                tables.pending_master.compile()
+                tables.master_regexps = tables.pending_master
+            self._warm_gens(tables)
+            return CompiledMapper(self, tables)
+        finally:
+            self.create_regs_lock.release()
+
+    def freeze(self, gc_freeze=True):
+        """Warm the mapper up before forking worker processes
+
+        Calls ``warmup``, then collects garbage and, when
+        ``gc_freeze`` is set and the interpreter supports it, moves
+        every object into the permanent generation with
+        ``gc.freeze()``. The garbage collector then never writes to
+        the pages holding the routes, so forked workers keep sharing
+        them copy-on-write.
+
+        """
+        self.warmup()
+        gc.collect()
+        if gc_freeze and hasattr(gc, 'freeze'):
+            gc.freeze()
+
+    def _table_cache_path(self, clist):
+        """Return the path of the table cache file for the connected
+        routes and the controller list"""
+        # Regexps are built by the route class, which can change from
+        # one version of routes to the next
+        definitions = [('%s.%s' % (type(route).__module__,
+                                   type(route).__name__),
+                        route.routepath, route.minimization, route.static,
+                        sorted(six.iteritems(route.defaults)),
+                        sorted(six.iteritems(route.reqs)))
+                       for route in self.matchlist]
+        key = repr((_TABLE_CACHE_VERSION, __version__, self.match_engine,
+                    getattr(self.regex_backend, '__name__', None),
+                    list(clist), definitions))
+        if isinstance(key, six.text_type):
+            key = key.encode('utf-8')
+        return os.path.join(self.table_cache,
+                            'routes-%s.json' % hashlib.sha1(key).hexdigest())
+
+    def _load_tables(self, path):
+        """Load the derived tables saved in ``path``, or return None
+        when they can't be read
+
+        The file is JSON, so reading it never runs code. Anything but
+        the expected lists of regexp sources and route positions is
+        ignored.
+
+        """
+        try:
+            with open(path, 'rb') as cache_file:
+                tables = json.loads(cache_file.read().decode('utf-8'))
+        except Exception:
+            return None
+        try:
+            if tables['version'] != _TABLE_CACHE_VERSION or \
+                    len(tables['regexps']) != len(self.matchlist):
+                return None
+            for regexp, master_regexp in tables['regexps']:
+                if not isinstance(regexp, six.string_types) or \
+                        not isinstance(master_regexp,
+                                       (six.string_types, type(None))):
+                    return None
+            count = len(self.matchlist)
+            for key, positions in six.iteritems(tables['literal_routes']):
+                if positions is not None and not all(
+                        type(position) is int and 0 <= position < count
+                        for position in positions):
+                    return None
+        except (TypeError, ValueError, KeyError, AttributeError):
+            return None
+        return tables
+
+    def _save_tables(self, tables, path, master_regexps):
+        """Save the derived tables to ``path``, ignoring write errors"""
+        positions = dict((route, position) for position, route
+                         in enumerate(self.matchlist))
+        regexps = [(route.regexp, None) for route in self.matchlist]
+        if master_regexps:
+            regexps = [(route.regexp, master_regexp) for route, master_regexp
+                       in zip(self.matchlist, master_regexps)]
+        literal_routes = {}
+        for key, routes in six.iteritems(tables.literal_routes):
+            if routes is not _PENDING:
+                routes = tuple(positions[route] for route in routes)
+            else:
+                routes = None
+            literal_routes[key] = routes
+        saved = dict(version=_TABLE_CACHE_VERSION, regexps=regexps,
+                     literal_routes=literal_routes)
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.table_cache,
+                                            suffix='.tmp')
+            with os.fdopen(fd, 'wb') as cache_file:
+                cache_file.write(json.dumps(saved).encode('utf-8'))
+            os.rename(tmp_path, path)
+        except (IOError, OSError):
+            pass
+
+    def _restore_literal_routes(self, literal_routes):
+        """Turn the route positions of a saved literal route table back
+        into routes"""
+        matchlist = self.matchlist
+        restored = {}
+        for key, positions in six.iteritems(literal_routes):
+            if positions is None:
+                restored[key] = _PENDING
+            else:
+                restored[key] = tuple(matchlist[position]
+                                      for position in positions)
+        return restored
+
+    def build_master_regexps(self, master=None):
+        """Compile the master regexps used to quickly reject URLs, when
+        ``lazy_regexps`` left them to a background thread
+
+        Does nothing if they're ready already, or if the regular
+        expressions were created again since ``master`` was made.
+
+        """
+        tables = self._tables
+        if master is None:
+            master = tables.pending_master
+        if master is None or master is tables.master_regexps:
+            return
+        if master.dirty:
+            master.compile()
+        if master is tables.pending_master:
+            tables.master_regexps = master
+
+    def _make_literal_routes(self, tables, lazy):
+        """Return the table of routes to try for each literal route
+        path"""
+        literal_routes = {}
+        for route in self.matchlist:
+            if not route.static and route._literal:
+                self._add_literal_paths(route, literal_routes,
+                                        tables.match_index, lazy)
+        return literal_routes
+
+    def _add_literal_paths(self, route, literal_routes, index, lazy):
+        """Add the paths of a literal route to the table, returning the
+        ones that weren't in it yet"""
+        path = ''.join(route.routelist)
+        if route.minimization and not path.startswith('/'):
+            path = '/' + path
+        added = []
+        for key in (path, path.rstrip('/'), path + '/'):
+            if key in literal_routes:
+                continue
+            if lazy:
+                # Worked out the first time the path is requested
+                literal_routes[key] = _PENDING
+            elif route.regmatch.match(key):
+                literal_routes[key] = self._literal_candidates(key, index)
+            else:
+                continue
+            added.append(key)
+        return added
+
+    def _add_literal_route(self, tables, route):
+        """Update the literal route table for a route appended to the
+        matchlist"""
+        literal_routes = tables.literal_routes
+        literal_keys = tables.literal_keys
+        prefix = route._static_prefix
+        lazy = self.lazy_regexps
+        # The paths already in the table that the route is a candidate
+        # for. It goes after the candidates with prefixes at least as
+        # long as its own.
+        position = bisect.bisect_left(literal_keys, prefix)
+        while position < len(literal_keys) and \
+                literal_keys[position].startswith(prefix):
+            key = literal_keys[position]
+            position += 1
+            routes = literal_routes[key]
+            if routes is _PENDING:
+                continue
+            if lazy:
+                literal_routes[key] = _PENDING
+            elif route.regmatch.match(key):
+                end = len(routes)
+                while end and len(routes[end - 1]._static_prefix) < \
+                        len(prefix):
+                    end -= 1
+                literal_routes[key] = routes[:end] + (route,) + routes[end:]
+        if route._literal:
+            for key in self._add_literal_paths(route, literal_routes,
+                                               tables.match_index, lazy):
+                bisect.insort(literal_keys, key)
+
+    def _make_urlcache(self):
+        """Return an empty URL generation cache with the ``urlcache_*``
+        options, or None when ``urlcache_size`` is 0"""
+        if not self.urlcache_size:
+            return None
+        return ClockCache(self.urlcache_size, self.urlcache_bytes,
+                          self.urlcache_ttl)
+
+    def _reset_cache(self, cache, size):
+        """Return an empty cache of the given size, reusing ``cache``
+        when possible"""
+        if not size:
+            return None
+        if cache is None or cache.capacity != size:
+            return ClockCache(size)
+        cache.clear()
+        return cache
+
     def _match(self, url, environ):
         """Internal Route matcher
 
@@ -698,47 +2022,14 @@ class Mapper(SubMapperParent):
         if self.always_scan:
             self.create_regs()
 
-        matchlog = []
-        if self.prefix:
-            if re.match(self._regprefix, url):
-                url = re.sub(self._regprefix, r'\1', url)
-                if not url:
-                    url = '/'
-            else:
-                return (None, None, matchlog)
-
-        environ = environ or self.environ
-        sub_domains = self.sub_domains
-        sub_domains_ignore = self.sub_domains_ignore
-        domain_match = self.domain_match
-        debug = self.debug
-
-        if self._master_regexp is not None:
-            # Check to see if its a valid url against the main regexp
-            # Done for faster invalid URL elimination
-            valid_url = re.match(self._master_regexp, url)
-        else:
-            # Regex is None due to OverflowError caused by too many routes.
-            # This will allow larger projects to work but might increase time
-            # spent invalidating URLs in the loop below.
-            valid_url = True
-        if not valid_url:
-            return (None, None, matchlog)
-
-        matchlist = it.chain.from_iterable(self._prefix2routes.get(url[:prefix_len], ())
-                                           for prefix_len in self._prefix_lens)
-        for route in matchlist:
-            if route.static:
-                if debug:
-                    matchlog.append(dict(route=route, static=True))
-                continue
-            match = route.match(url, environ, sub_domains, sub_domains_ignore,
-                                domain_match)
-            if debug:
-                matchlog.append(dict(route=route, regexp=bool(match)))
-            if isinstance(match, dict) or match:
-                return (match, route, matchlog)
-        return (None, None, matchlog)
+        cache = self.match_cache
+        miss_cache = self.miss_cache
+        if self.debug or self.always_scan:
+            cache = miss_cache = None
+        # Read after the caches, which are replaced after the tables
+        tables = self._tables
+        return self._match_tables(tables, url, environ or self.environ,
+                                  cache, miss_cache)
 
     def match(self, url=None, environ=None):
         """Match a URL against against one of the routes contained.
@@ -799,15 +2090,9 @@ class Mapper(SubMapperParent):
         # Generate ourself if we haven't already
         if not self._created_gens:
             self._create_gens()
-
-        if self.append_slash:
-            kargs['_append_slash'] = True
-
-        if not self.explicit:
-            if 'controller' not in kargs:
-                kargs['controller'] = 'content'
-            if 'action' not in kargs:
-                kargs['action'] = 'index'
+        urlcache = self.urlcache
+        # Read after the cache, which is replaced after the tables
+        tables = self._tables
 
         environ = kargs.pop('_environ', self.environ) or {}
         if 'SCRIPT_NAME' in environ:
@@ -816,141 +2101,12 @@ class Mapper(SubMapperParent):
             script_name = self.environ['SCRIPT_NAME']
         else:
             script_name = ""
-        controller = kargs.get('controller', None)
-        action = kargs.get('action', None)
-
-        # If the URL didn't depend on the SCRIPT_NAME, we'll cache it
-        # keyed by just by kargs; otherwise we need to cache it with
-        # both SCRIPT_NAME and kargs:
-        cache_key = six.text_type(args).encode('utf8') + \
-            six.text_type(kargs).encode('utf8')
-
-        if self.urlcache is not None:
-            if six.PY3:
-                cache_key_script_name = b':'.join((script_name.encode('utf-8'),
-                                                   cache_key))
-            else:
-                cache_key_script_name = '%s:%s' % (script_name, cache_key)
-
-            # Check the url cache to see if it exists, use it if it does
-            val = self.urlcache.get(cache_key_script_name, self)
-            if val != self:
-                return val
-
-        controller = as_unicode(controller, self.encoding)
-        action = as_unicode(action, self.encoding)
-
-        actionlist = self._gendict.get(controller) or self._gendict.get('*', {})
-        if not actionlist and not args:
-            return None
-        (keylist, sortcache) = actionlist.get(action) or \
-            actionlist.get('*', (None, {}))
-        if not keylist and not args:
-            return None
-
-        keys = frozenset(kargs.keys())
-        cacheset = False
-        cachekey = six.text_type(keys)
-        cachelist = sortcache.get(cachekey)
-        if args:
-            keylist = args
-        elif cachelist:
-            keylist = cachelist
-        else:
-            cacheset = True
-            newlist = []
-            for route in keylist:
-                if len(route.minkeys - route.dotkeys - keys) == 0:
-                    newlist.append(route)
-            keylist = newlist
-
-            class KeySorter:
-
-                def __init__(self, obj, *args):
-                    self.obj = obj
-
-                def __lt__(self, other):
-                    return self._keysort(self.obj, other.obj) < 0
-
-                def _keysort(self, a, b):
-                    """Sorts two sets of sets, to order them ideally for
-                    matching."""
-                    a = a.maxkeys
-                    b = b.maxkeys
-
-                    lendiffa = len(keys ^ a)
-                    lendiffb = len(keys ^ b)
-                    # If they both match, don't switch them
-                    if lendiffa == 0 and lendiffb == 0:
-                        return 0
-
-                    # First, if a matches exactly, use it
-                    if lendiffa == 0:
-                        return -1
-
-                    # Or b matches exactly, use it
-                    if lendiffb == 0:
-                        return 1
-
-                    # Neither matches exactly, return the one with the most in
-                    # common
-                    if self._compare(lendiffa, lendiffb) != 0:
-                        return self._compare(lendiffa, lendiffb)
-
-                    # Neither matches exactly, but if they both have just as
-                    # much in common
-                    if len(keys & b) == len(keys & a):
-                        # Then we return the shortest of the two
-                        return self._compare(len(a), len(b))
-
-                    # Otherwise, we return the one that has the most in common
-                    else:
-                        return self._compare(len(keys & b), len(keys & a))
-
-                def _compare(self, obj1, obj2):
-                    if obj1 < obj2:
-                        return -1
-                    elif obj1 < obj2:
-                        return 1
-                    else:
-                        return 0
-
-            keylist.sort(key=KeySorter)
-            if cacheset:
-                sortcache[cachekey] = keylist
+        return self._generate(tables, urlcache, script_name, args, kargs)
 
-        # Iterate through the keylist of sorted routes (or a single route if
-        # it was passed in explicitly for hardcoded named routes)
-        for route in keylist:
-            fail = False
-            for key in route.hardcoded:
-                kval = kargs.get(key)
-                if not kval:
-                    continue
-                kval = as_unicode(kval, self.encoding)
-                if kval != route.defaults[key] and \
-                        not callable(route.defaults[key]):
-                    fail = True
-                    break
-            if fail:
-                continue
-            path = route.generate(**kargs)
-            if path:
-                if self.prefix:
-                    path = self.prefix + path
-                external_static = route.static and route.external
-                if not route.absolute and not external_static:
-                    path = script_name + path
-                    if self.urlcache is not None:
-                       key = cache_key_script_name
-                else:
-                    key = cache_key
-                if self.urlcache is not None:
-                    self.urlcache.put(key, str(path))
-                return str(path)
-            else:
-                continue
-        return None
+    def _gen_routes(self, tables, controller, action):
+        """Return the ``(routes, sortcache)`` entry of the generation
+        index for a controller and action"""
+        return tables.gen_index.lookup(controller, action)
 
     def resource(self, member_name, collection_name, **kwargs):
         """Generate routes for a controller resource
@@ -0,0 +1,351 @@
+"""Candidate indexes used by the Mapper during URL recognition
+
+Every index answers the same question: given a URL, which routes could
+possibly match it, and in which order should they be tried. Routes are
+grouped by their static prefix, and a route is only a candidate when
+the URL starts with that prefix. Candidates are returned longest prefix
+first, and in the order they were connected within a prefix.
+
+"""
+import itertools as it
+import re
+
+import six
+
+
+class PrefixIndex(object):
+    """Groups routes by static prefix and probes the URL once for every
+    distinct prefix length"""
+
+    def __init__(self):
+        self.prefix2routes = {}
+        self.prefix_lens = []
+
+    def add(self, prefix, route):
+        """Add a route under its static prefix"""
+        routes = self.prefix2routes.get(prefix)
+        if routes is None:
+            routes = self.prefix2routes[prefix] = []
+            if len(prefix) not in self.prefix_lens:
+                self.prefix_lens.append(len(prefix))
+                self.prefix_lens.sort(reverse=True)
+        routes.append(route)
+
+    def candidates(self, url):
+        """Return an iterable of the routes to try for ``url``"""
+        prefix2routes = self.prefix2routes
+        url_len = len(url)
+        return it.chain.from_iterable(prefix2routes.get(url[:prefix_len], ())
+                                      for prefix_len in self.prefix_lens
+                                      if prefix_len <= url_len)
+
+
+class _SegmentNode(object):
+    __slots__ = ('children', 'partials', 'partial_lens')
+
+    def __init__(self):
+        self.children = {}
+        self.partials = {}
+        self.partial_lens = []
+
+
+class SegmentTree(object):
+    """Radix tree keyed on the '/' separated segments of static prefixes
+
+    A prefix such as ``/admin/comm`` is stored as the complete segments
+    ``''`` and ``'admin'``, followed by the partial segment ``'comm'``
+    which the URL's next segment only has to start with. Matching walks
+    the URL segments once, collecting the route groups whose prefix
+    the URL starts with.
+
+    """
+
+    def __init__(self):
+        self.root = _SegmentNode()
+
+    def add(self, prefix, route):
+        """Add a route under its static prefix"""
+        parts = prefix.split('/')
+        node = self.root
+        for part in parts[:-1]:
+            child = node.children.get(part)
+            if child is None:
+                child = node.children[part] = _SegmentNode()
+            node = child
+        partial = parts[-1]
+        routes = node.partials.get(partial)
+        if routes is None:
+            routes = node.partials[partial] = []
+            if len(partial) not in node.partial_lens:
+                node.partial_lens.append(len(partial))
+                node.partial_lens.sort()
+        routes.append(route)
+
+    def candidates(self, url):
+        """Return an iterable of the routes to try for ``url``"""
+        groups = []
+        node = self.root
+        for segment in url.split('/'):
+            if node.partial_lens:
+                partials = node.partials
+                for partial_len in node.partial_lens:
+                    if partial_len > len(segment):
+                        break
+                    routes = partials.get(segment[:partial_len])
+                    if routes:
+                        groups.append(routes)
+            node = node.children.get(segment)
+            if node is None:
+                break
+        # Groups were found shortest prefix first
+        groups.reverse()
+        return it.chain.from_iterable(groups)
+
+
+# Turns named groups into plain capturing groups, which keeps the group
+# numbering of the pattern intact
+_group_name = re.compile(r'\(\?P<[A-Za-z_][A-Za-z0-9_]*>')
+
+
+def _compile_errors(backend):
+    """Return the exceptions raised when a combined regexp is too large
+    for ``backend`` to compile"""
+    errors = (OverflowError, AssertionError, RuntimeError)
+    error = getattr(backend, 'error', None)
+    if error is not None and backend is not re:
+        errors += (error,)
+    return errors
+
+
+class _RegexpShard(object):
+    __slots__ = ('regexp', 'routes', 'positions', 'groups')
+
+    def __init__(self, regexp, routes, positions, groups):
+        self.regexp = regexp
+        self.routes = routes
+        self.positions = positions
+        self.groups = groups
+
+
+class CombinedRegexpIndex(object):
+    """Matches every route with one alternation of their regexps
+
+    Each route's regexp is wrapped in a capturing group, so the index
+    of the last matched group (``match.lastindex``) identifies the
+    route that matched, and its variables are read from the group
+    numbers they were given inside the alternation. If that route then
+    fails its conditions, the remaining routes of the same shard are
+    tried one by one before moving on to the next shard.
+
+    Routes are combined in shards of at most ``shard_size`` routes,
+    which bounds how many routes are tried one by one after a false
+    positive. Shards too large to compile are split further, down to
+    single routes that are tried on their own.
+
+    """
+    shard_size = 100
+
+    def __init__(self, backend=re):
+        self.backend = backend
+        self.routes = []
+        self.shards = None
+
+    def add(self, prefix, route):
+        """Add a route, its regexp must have been made already"""
+        self.routes.append(route)
+        self.shards = None
+
+    def candidates(self, url):
+        """Return an iterable of the routes to try for ``url``"""
+        if self.shards is None:
+            self.compile()
+        return (route for shard in self.shards for route in shard.routes
+                if url.startswith(route._static_prefix))
+
+    def compile(self):
+        """Compile the shards of combined regexps"""
+        # Longest static prefix first, connect order within a prefix
+        routes = sorted(self.routes, key=lambda r: -len(r._static_prefix))
+        self.shards = self._make_shards(routes)
+
+    def _make_shards(self, routes):
+        if len(routes) > self.shard_size:
+            return list(it.chain.from_iterable(
+                self._make_shards(routes[i:i + self.shard_size])
+                for i in range(0, len(routes), self.shard_size)))
+        if not routes:
+            return []
+        parts = []
+        positions = {}
+        groups = []
+        group = 1
+        for position, route in enumerate(routes):
+            parts.append('(%s)' % _group_name.sub('(', route.regexp))
+            positions[group] = position
+            groups.append([(name, group + index) for name, index in
+                           six.iteritems(route.regmatch.groupindex)])
+            group += route.regmatch.groups + 1
+        try:
+            regexp = self.backend.compile('|'.join(parts))
+        except _compile_errors(self.backend):
+            regexp = None
+        if regexp is not None and regexp.groups == group - 1:
+            return [_RegexpShard(regexp, routes, positions, groups)]
+        if len(routes) == 1:
+            return [_RegexpShard(None, routes, None, None)]
+        half = len(routes) // 2
+        return self._make_shards(routes[:half]) + \
+            self._make_shards(routes[half:])
+
+    def match(self, url, environ=None, sub_domains=False,
+              sub_domains_ignore=None, domain_match='', matchlog=None):
+        """Match a URL, returning the result dict and route or a tuple
+        of Nones"""
+        if self.shards is None:
+            self.compile()
+        for shard in self.shards:
+            start = 0
+            if shard.regexp is not None:
+                found = shard.regexp.match(url)
+                if not found:
+                    continue
+                start = shard.positions[found.lastindex]
+                route = shard.routes[start]
+                start += 1
+                if url.startswith(route._static_prefix):
+                    matchdict = dict((name, found.group(index)) for
+                                     name, index in shard.groups[start - 1])
+                    match = route.match_groups(matchdict, environ,
+                                               sub_domains,
+                                               sub_domains_ignore,
+                                               domain_match)
+                    if matchlog is not None:
+                        matchlog.append(dict(route=route, regexp=bool(match)))
+                    if isinstance(match, dict) or match:
+                        return (match, route)
+            # Either a false positive, or routes tried on their own
+            for route in shard.routes[start:]:
+                if not url.startswith(route._static_prefix):
+                    continue
+                match = route.match(url, environ, sub_domains,
+                                    sub_domains_ignore, domain_match)
+                if matchlog is not None:
+                    matchlog.append(dict(route=route, regexp=bool(match)))
+                if isinstance(match, dict) or match:
+                    return (match, route)
+        return (None, None)
+
+
+def first_segment(url):
+    """Return the URL up to its second '/'
+
+    A final newline is left out, as the trailing ``$`` of a route
+    regexp also matches before it.
+
+    """
+    end = url.find('/', 1)
+    if end == -1:
+        if url.endswith('\n'):
+            return url[:-1]
+        return url
+    return url[:end]
+
+
+class MasterRegexps(object):
+    """Master regexps used to quickly reject URLs no route can match
+
+    The unnamed regexps of all routes are grouped by the first segment
+    of the URLs they match, and every group is compiled in shards of at
+    most ``shard_size`` routes. A URL only has to be checked against the
+    shards of its own first segment, plus the shards of routes whose
+    path doesn't decide the first segment.
+
+    Regexps added after compiling only recompile the last shard of
+    their group.
+
+    """
+
+    def __init__(self, shard_size=500, backend=re):
+        self.shard_size = shard_size
+        self.backend = backend
+        self.groups = {}
+        self.general = []
+        self.shards = {}
+        self.general_shards = []
+        self.dirty = set()
+
+    def add(self, segment, regexp):
+        """Add a route's unnamed regexp under the first segment of the
+        URLs it matches, or ``None``"""
+        if segment is not None:
+            self.groups.setdefault(segment, []).append(regexp)
+        else:
+            self.general.append(regexp)
+        self.dirty.add(segment)
+
+    def compile(self):
+        """Compile the groups that changed since the last compile"""
+        for segment in list(self.dirty):
+            self.dirty.discard(segment)
+            if segment is None:
+                self.general_shards = self._extend_shards(
+                    self.general_shards, self.general)
+            else:
+                self.shards[segment] = self._extend_shards(
+                    self.shards.get(segment, []), self.groups[segment])
+
+    def _extend_shards(self, shards, regexps):
+        """Return ``shards`` extended to cover every regexp, recompiling
+        the last shard when it has room left"""
+        covered = sum(size for regexp, size in shards)
+        if shards and shards[-1][1] < self.shard_size:
+            covered -= shards[-1][1]
+            shards = shards[:-1]
+        return shards + self._make_shards(regexps[covered:])
+
+    def _make_shards(self, regexps):
+        if len(regexps) > self.shard_size:
+            return list(it.chain.from_iterable(
+                self._make_shards(regexps[i:i + self.shard_size])
+                for i in range(0, len(regexps), self.shard_size)))
+        if not regexps:
+            return []
+        try:
+            regexp = self.backend.compile(
+                '|'.join(['(?:%s)' % x for x in regexps]))
+        except _compile_errors(self.backend):
+            if len(regexps) == 1:
+                raise
+            half = len(regexps) // 2
+            return self._make_shards(regexps[:half]) + \
+                self._make_shards(regexps[half:])
+        return [(regexp, len(regexps))]
+
+    def match(self, url):
+        """Return whether any route's regexp could match the URL"""
+        if self.dirty:
+            self.compile()
+        for regexp, size in it.chain(self.shards.get(first_segment(url), ()),
+                                     self.general_shards):
+            if regexp.match(url):
+                return True
+        return False
+
+    def stats(self):
+        """Return a list of ``(first segment, number of routes)`` tuples
+        for every shard, ``None`` standing for the shards every URL is
+        checked against"""
+        if self.dirty:
+            self.compile()
+        stats = [(None, size) for regexp, size in self.general_shards]
+        for segment in sorted(self.shards):
+            stats.extend((segment, size) for regexp, size
+                         in self.shards[segment])
+        return stats
+
+
+match_engines = {
+    'prefix': PrefixIndex,
+    'tree': SegmentTree,
+    'combined': CombinedRegexpIndex,
+}
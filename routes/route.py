@@ -1,3 +1,4 @@
+import itertools as it
 import re
 import sys
 
@@ -7,6 +8,30 @@ from six.moves.urllib import parse as urlparse
 from routes.util import _url_quote as url_quote, _str_encode, as_unicode
 
 
+def _intern(string):
+    """Intern a path part or key name, leaving unicode alone on
+    Python 2"""
+    try:
+        return six.moves.intern(string)
+    except TypeError:
+        return string
+
+
+# Memos of parsed route paths and built regexps, shared by routes with
+# the same templates. Emptied when they grow past _memo_size.
+_parsed_paths = {}
+_built_regexps = {}
+_memo_size = 4096
+
+
+def _memoize(memo, key, value):
+    """Store a value in a memo, emptying it first when it's full"""
+    if len(memo) >= _memo_size:
+        memo.clear()
+    memo[key] = value
+    return value
+
+
 class Route(object):
     """The Route object holds a route recognition and generation
     routine.
@@ -20,6 +45,22 @@ class Route(object):
     # special chars to indicate a natural split in the URL
     done_chars = ('/', ',', ';', '.', '#')
 
+    __slots__ = (
+        'routepath', 'sub_domains', 'prior', 'redirect', 'redirect_status',
+        'name', '_kargs', 'minimization', 'encoding', 'reqs', 'req_regs',
+        'decode_errors', 'static', 'filter', 'absolute', 'external',
+        'member_name', 'collection_name', 'parent_resource', 'conditions',
+        'explicit', 'routelist', 'dotkeys', 'regpath', 'defaults', 'maxkeys',
+        'minkeys', '_required_keys', 'routebackwards', 'hardcoded',
+        'regmatch', '_regexp',
+        '_regex_compile', '_default_keys', '_literal', '_static_prefix',
+        '_min_segments', '_max_segments', '_min_length',
+        '_required_suffixes', '_required_infixes', '_required_literals',
+        '_first_segment', '_template', '__weakref__',
+        # Attributes applications set on their routes
+        '__dict__',
+    )
+
     def __init__(self, name, routepath, **kargs):
         """Initialize a route, with a given routepath for
         matching/generation
@@ -96,9 +137,7 @@ class Route(object):
             self.make_full_route()
 
         # Build a req list with all the regexp requirements for our args
-        self.req_regs = {}
-        for key, val in six.iteritems(self.reqs):
-            self.req_regs[key] = re.compile('^' + val + '$')
+        self._compile_reqs(re)
         # Update our defaults and set new default keys if needed. defaults
         # needs to be saved
         (self.defaults, defaultkeys) = self._defaults(routekeys,
@@ -110,6 +149,8 @@ class Route(object):
         # Populate our minimum keys, and save a copy of our backward keys for
         # quicker generation later
         (self.minkeys, self.routebackwards) = self._minkeys(routelist[:])
+        # The keys a URL can't be generated without
+        self._required_keys = self.minkeys - self.dotkeys
 
         # Populate our hardcoded keys, these are ones that are set and don't
         # exist in the route
@@ -120,6 +161,98 @@ class Route(object):
         # Cache our default keys
         self._default_keys = frozenset(self.defaults.keys())
 
+        # Everything the regexp is built from besides the controllers
+        self._template = (self.__class__, self.routepath, self.static,
+                          self.minimization,
+                          frozenset(six.iteritems(self.reqs)),
+                          routekeys & self._default_keys,
+                          'controller' in routekeys)
+
+        # Routes without any variables can be matched by a plain lookup
+        self._literal = not routekeys
+
+        # The static text every matching URL starts with, used to group
+        # routes for faster matching
+        prefix = ''.join(it.takewhile(lambda p: isinstance(p, str),
+                                      routelist))
+        if self.minimization and not prefix.startswith('/'):
+            prefix = '/' + prefix
+        self._static_prefix = prefix.rstrip('/')
+
+        # Bounds on the number of '/' and the length of a matching URL,
+        # cheaper to check than the regexp. Only non-minimized routes
+        # require every part of their path.
+        self._min_segments = 0
+        self._max_segments = sys.maxsize
+        self._min_length = 0
+        if not self.minimization and not self.static:
+            literals = [part for part in routelist
+                        if not isinstance(part, dict)]
+            self._min_segments = sum(part.count('/') for part in literals)
+            self._min_length = sum(len(part) for part in literals)
+            self._max_segments = self._min_segments
+            for part in routelist:
+                if not isinstance(part, dict):
+                    continue
+                # Requirements and controller names may contain slashes
+                # and match empty strings
+                if part['type'] == '*' or part['name'] in self.reqs or \
+                        part['name'] == 'controller':
+                    self._max_segments = sys.maxsize
+                if part['type'] != '.' and part['name'] not in self.reqs \
+                        and part['name'] != 'controller':
+                    self._min_length += 1
+
+        # Literal text after the first variable that every matching URL
+        # contains, checked with str methods before the regexp. A
+        # non-minimized route requires all of its parts, while a
+        # minimized route only requires the ones that can't be left off.
+        suffix = None
+        infixes = []
+        if not self._literal and not self.static:
+            parts = list(it.dropwhile(lambda p: not isinstance(p, dict),
+                                      routelist))
+            if self.minimization:
+                infixes = [part for part in parts
+                           if not isinstance(part, dict) and part and
+                           part[-1] not in self.done_chars]
+            else:
+                runs = ['']
+                for part in parts:
+                    if isinstance(part, dict):
+                        runs.append('')
+                    else:
+                        runs[-1] += part
+                if runs[-1]:
+                    suffix = runs[-1]
+                infixes = runs[1:-1]
+        infixes = tuple(infix for infix in infixes
+                        if infix and infix not in self._static_prefix)
+        # A trailing '$' also matches before a final newline
+        self._required_suffixes = suffix and (suffix, suffix + '\n')
+        self._required_infixes = infixes
+        self._required_literals = bool(suffix or infixes)
+
+        # The first segment every matching URL has, if the route path
+        # decides it
+        end = prefix.find('/', 1)
+        if end != -1:
+            self._first_segment = prefix[:end]
+        elif self._literal:
+            self._first_segment = prefix
+        else:
+            self._first_segment = None
+
+    def _lacks_literals(self, url):
+        """Whether the URL is missing literal text this route requires"""
+        if self._required_suffixes and \
+                not url.endswith(self._required_suffixes):
+            return True
+        for infix in self._required_infixes:
+            if infix not in url:
+                return True
+        return False
+
     def make_full_route(self):
         """Make a full routelist string for use with non-minimized
         generation"""
@@ -144,20 +277,40 @@ class Route(object):
 
     def _pathkeys(self, routepath):
         """Utility function to walk the route, and pull out the valid
-        dynamic/wildcard keys."""
+        dynamic/wildcard keys.
+
+        Parsed paths are memoized, and the requirements given inline
+        with a variable are added to ``self.reqs``.
+
+        """
+        key = (routepath, self.static)
+        parsed = _parsed_paths.get(key)
+        if parsed is None:
+            parsed = _memoize(_parsed_paths, key,
+                              self._parsepath(routepath))
+        routelist, inline_reqs = parsed
+        self.reqs.update(inline_reqs)
+        # The memoized parts are copied, like a freshly parsed path
+        return [dict(part) if isinstance(part, dict) else part
+                for part in routelist]
+
+    def _parsepath(self, routepath):
+        """Parse a route path in a single pass, returning its routelist
+        and a list of the requirements given inline"""
         collecting = False
         escaping = False
-        current = ''
+        current = []
         done_on = ''
         var_type = ''
         just_started = False
         routelist = []
+        inline_reqs = []
         for char in routepath:
             if escaping:
                 if char in ['\\', ':', '*', '{', '}']:
-                    current += char
+                    current.append(char)
                 else:
-                    current += '\\' + char
+                    current.append('\\' + char)
                 escaping = False
             elif char == '\\':
                 escaping = True
@@ -170,40 +323,43 @@ class Route(object):
                     done_on = '}'
                     just_started = False
                 if len(current) > 0:
-                    routelist.append(current)
-                    current = ''
+                    routelist.append(_intern(''.join(current)))
+                    current = []
             elif collecting and just_started:
                 just_started = False
                 if char == '(':
                     done_on = ')'
                 else:
-                    current = char
+                    current = [char]
                     done_on = self.done_chars + ('-',)
             elif collecting and char not in done_on:
-                current += char
+                current.append(char)
             elif collecting:
                 collecting = False
+                name = ''.join(current)
                 if var_type == '{':
-                    if current[0] == '.':
+                    if name[0] == '.':
                         var_type = '.'
-                        current = current[1:]
+                        name = name[1:]
                     else:
                         var_type = ':'
-                    opts = current.split(':')
+                    opts = name.split(':')
                     if len(opts) > 1:
-                        current = opts[0]
-                        self.reqs[current] = opts[1]
-                routelist.append(dict(type=var_type, name=current))
+                        name = opts[0]
+                        inline_reqs.append((name, opts[1]))
+                routelist.append(dict(type=var_type, name=_intern(name)))
                 if char in self.done_chars:
                     routelist.append(char)
-                done_on = var_type = current = ''
+                done_on = var_type = ''
+                current = []
             else:
-                current += char
+                current.append(char)
         if collecting:
-            routelist.append(dict(type=var_type, name=current))
+            routelist.append(dict(type=var_type,
+                                  name=_intern(''.join(current))))
         elif current:
-            routelist.append(current)
-        return routelist
+            routelist.append(_intern(''.join(current)))
+        return (routelist, inline_reqs)
 
     def _minkeys(self, routelist):
         """Utility function to walk the route backwards
@@ -279,7 +435,60 @@ class Route(object):
 
         return (defaults, newdefaultkeys)
 
-    def makeregexp(self, clist, include_names=True):
+    def __getattr__(self, name):
+        # Only reached for attributes that aren't set, a lazily
+        # compiled regexp is compiled the first time it's read
+        if name != 'regmatch':
+            raise AttributeError(name)
+        regexp = self._regexp
+        if regexp is None:
+            # Another thread compiled it in the meantime
+            return self.regmatch
+        regmatch = self.regmatch = self._regex_compile(regexp)
+        self._regexp = None
+        return regmatch
+
+    @property
+    def regexp(self):
+        """The source of the route's regexp
+
+        The source is only kept until the regexp is compiled, and read
+        back from the compiled pattern after that.
+
+        """
+        regexp = self._regexp
+        if regexp is None:
+            return self.regmatch.pattern
+        return regexp
+
+    def _share_data(self, shared):
+        """Replace the key sets with identical ones from ``shared``, a
+        dict of the sets other routes use
+
+        The sets are frozen, so routes with the same keys, such as the
+        ones made for every resource, can hold the same objects. The
+        routelist and defaults can be changed, every route keeps its
+        own.
+
+        """
+        for attr in ('maxkeys', 'minkeys', 'dotkeys', 'hardcoded',
+                     '_default_keys', '_required_keys'):
+            value = getattr(self, attr)
+            setattr(self, attr, shared.setdefault(value, value))
+
+    def _compile_reqs(self, backend):
+        """Compile the requirement regexps with the given regexp
+        module"""
+        # Only the compile function is kept, unlike the module it's
+        # pickled by reference along with the route
+        compile = backend.compile
+        self.req_regs = {}
+        for key, val in six.iteritems(self.reqs):
+            self.req_regs[key] = compile('^' + val + '$')
+        self._regex_compile = compile
+
+    def makeregexp(self, clist, include_names=True, backend=re,
+                   lazy=False):
         """Create a regular expression for matching purposes
 
         Note: This MUST be called before match can function properly.
@@ -294,25 +503,51 @@ class Route(object):
         should be excluded for use in a single larger regexp to
         determine if any routes match
 
-        """
-        if self.minimization:
-            reg = self.buildnextreg(self.routelist, clist, include_names)[0]
-            if not reg:
-                reg = '/'
-            reg = reg + '/?' + '$'
+        backend is the module used to compile the regexps, anything
+        with an ``re`` compatible ``compile`` function such as the
+        ``regex`` module. The requirement regexps are recompiled with
+        it too.
 
-            if not reg.startswith('/'):
-                reg = '/' + reg
-        else:
-            reg = self.buildfullreg(clist, include_names)
+        lazy delays compiling the regexp until ``regmatch`` is first
+        used.
 
-        reg = '^' + reg
+        """
+        template = self._template
+        key = (template, include_names, template[-1] and tuple(clist))
+        reg = _built_regexps.get(key)
+        if reg is None:
+            if self.minimization:
+                reg = self.buildnextreg(self.routelist, clist,
+                                        include_names)[0]
+                if not reg:
+                    reg = '/'
+                reg = reg + '/?' + '$'
+
+                if not reg.startswith('/'):
+                    reg = '/' + reg
+            else:
+                reg = self.buildfullreg(clist, include_names)
+
+            reg = _memoize(_built_regexps, key, '^' + reg)
 
         if not include_names:
             return reg
-
-        self.regexp = reg
-        self.regmatch = re.compile(reg)
+        self.set_regexp(reg, backend, lazy)
+
+    def set_regexp(self, reg, backend=re, lazy=False):
+        """Use an already built regexp for matching, compiling it with
+        ``backend`` unless ``lazy`` is set"""
+        if backend.compile != self._regex_compile:
+            self._compile_reqs(backend)
+        if lazy:
+            self._regexp = reg
+            try:
+                del self.regmatch
+            except AttributeError:
+                pass
+        else:
+            self.regmatch = backend.compile(reg)
+            self._regexp = None
 
     def buildfullreg(self, clist, include_names=True):
         """Build the regexp by iterating through the routelist and
@@ -343,27 +578,34 @@ class Route(object):
         return regexp
 
     def buildnextreg(self, path, clist, include_names=True):
-        """Recursively build our regexp given a path, and a controller
-        list.
+        """Build our regexp given a path, and a controller list.
 
         Returns the regular expression string, and two booleans that
         can be ignored as they're only used internally by buildnextreg.
 
+        The path is walked backwards, one part at a time, as each part's
+        regexp depends on what's in the rest of the path.
+
         """
-        if path:
-            part = path[0]
-        else:
-            part = ''
-        reg = ''
+        # Every part is matched knowing the next to last part of the
+        # path
+        if len(path) > 1:
+            self.prior = path[-2]
 
         # noreqs will remember whether the remainder has either a string
         # match, or a non-defaulted regexp match on a key, allblank remembers
         # if the rest could possible be completely empty
         (rest, noreqs, allblank) = ('', True, True)
-        if len(path[1:]) > 0:
-            self.prior = part
-            (rest, noreqs, allblank) = self.buildnextreg(path[1:], clist,
-                                                         include_names)
+        for part in reversed(path or ['']):
+            (rest, noreqs, allblank) = self._buildpartreg(
+                part, rest, noreqs, allblank, clist, include_names)
+        return (rest, noreqs, allblank)
+
+    def _buildpartreg(self, part, rest, noreqs, allblank, clist,
+                      include_names):
+        """Build the regexp of one part of the path in front of the
+        regexp of the rest of it"""
+        reg = ''
         if isinstance(part, dict) and part['type'] in (':', '.'):
             var = part['name']
             typ = part['type']
@@ -541,30 +783,23 @@ class Route(object):
         if not match:
             return False
 
-        sub_domain = None
+        return self.match_groups(match.groupdict(), environ, sub_domains,
+                                 sub_domains_ignore, domain_match)
 
-        if sub_domains and environ and 'HTTP_HOST' in environ:
-            host = environ['HTTP_HOST'].split(':')[0]
-            sub_match = re.compile(r'^(.+?)\.%s$' % domain_match)
-            subdomain = re.sub(sub_match, r'\1', host)
-            if subdomain not in sub_domains_ignore and host != subdomain:
-                sub_domain = subdomain
+    def match_groups(self, matchdict, environ=None, sub_domains=False,
+                     sub_domains_ignore=None, domain_match=''):
+        """Finish a match given the named groups of a successful regexp
+        match against this route.
 
-        if self.conditions:
-            if 'method' in self.conditions and environ and \
-                    environ['REQUEST_METHOD'] not in self.conditions['method']:
-                return False
+        Checks the route conditions and fills in defaults, returning
+        the result dict or False just like ``match``.
 
-            # Check sub-domains?
-            use_sd = self.conditions.get('sub_domain')
-            if use_sd and not sub_domain:
-                return False
-            elif not use_sd and 'sub_domain' in self.conditions and sub_domain:
-                return False
-            if isinstance(use_sd, list) and sub_domain not in use_sd:
-                return False
+        """
+        passed, sub_domain = self._match_conditions(
+            environ, sub_domains, sub_domains_ignore, domain_match)
+        if not passed:
+            return False
 
-        matchdict = match.groupdict()
         result = {}
         extras = self._default_keys - frozenset(matchdict.keys())
         for key, val in six.iteritems(matchdict):
@@ -583,6 +818,59 @@ class Route(object):
         for key in extras:
             result[key] = self.defaults[key]
 
+        return self._match_result(result, environ, sub_domains, sub_domain)
+
+    def match_literal(self, environ=None, sub_domains=False,
+                      sub_domains_ignore=None, domain_match=''):
+        """Match a URL that is already known to match this route's
+        regexp, for routes without any variables in their path.
+
+        Skips the regexp entirely, the result is a copy of the route
+        defaults once the conditions pass.
+
+        """
+        passed, sub_domain = self._match_conditions(
+            environ, sub_domains, sub_domains_ignore, domain_match)
+        if not passed:
+            return False
+        return self._match_result(self.defaults.copy(), environ,
+                                  sub_domains, sub_domain)
+
+    def _match_conditions(self, environ, sub_domains, sub_domains_ignore,
+                          domain_match):
+        """Check the method and sub-domain conditions
+
+        Returns a tuple of whether the conditions passed, and the
+        sub-domain of the request if there is one.
+
+        """
+        sub_domain = None
+
+        if sub_domains and environ and 'HTTP_HOST' in environ:
+            host = environ['HTTP_HOST'].split(':')[0]
+            sub_match = re.compile(r'^(.+?)\.%s$' % domain_match)
+            subdomain = re.sub(sub_match, r'\1', host)
+            if subdomain not in sub_domains_ignore and host != subdomain:
+                sub_domain = subdomain
+
+        if self.conditions:
+            if 'method' in self.conditions and environ and \
+                    environ['REQUEST_METHOD'] not in self.conditions['method']:
+                return False, None
+
+            # Check sub-domains?
+            use_sd = self.conditions.get('sub_domain')
+            if use_sd and not sub_domain:
+                return False, None
+            elif not use_sd and 'sub_domain' in self.conditions and sub_domain:
+                return False, None
+            if isinstance(use_sd, list) and sub_domain not in use_sd:
+                return False, None
+
+        return True, sub_domain
+
+    def _match_result(self, result, environ, sub_domains, sub_domain):
+        """Finish a match result dict, applying any function condition"""
         # Add the sub-domain if there is one
         if sub_domains:
             result['sub_domain'] = sub_domain
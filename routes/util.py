@@ -26,6 +26,19 @@ class GenerationException(RoutesException):
     """Tossed during URL generation exceptions"""
 
 
+# Keys URLGenerator handles itself, or that change how a route is
+# generated
+_special_keys = frozenset([
+    'anchor', 'host', 'protocol', 'qualified', 'anchor_', 'host_',
+    'protocol_', '_anchor', '_host', '_protocol', '_use_current',
+    '_environ', 'sub_domain', 'method',
+])
+
+
+# Special keys that bound URL generators handle once, when binding
+_url_keys = frozenset(['anchor', 'host', 'protocol', 'qualified'])
+
+
 def _screenargs(kargs, mapper, environ, force_explicit=False):
     """
     Private function that takes a dict, and screens it against the current
@@ -330,6 +343,19 @@ class URLGenerator(object):
                             needed
 
         """
+        # Named routes called with plain keyword arguments skip the
+        # generic path
+        if len(args) == 1 and _special_keys.isdisjoint(kargs):
+            script_name = self.environ.get('SCRIPT_NAME')
+            if script_name is not None:
+                url = self.mapper._build_url(args[0], kargs, script_name)
+                if url is not None:
+                    if not ascii_characters(url):
+                        raise GenerationException(
+                            "Can only return a string, got unicode "
+                            "instead: %s" % url)
+                    return url
+
         anchor = kargs.get('anchor')
         host = kargs.get('host')
         protocol = kargs.pop('protocol', None)
@@ -453,6 +479,88 @@ class URLGenerator(object):
         """
         return self(_use_current=True, *args, **kwargs)
 
+    def bind(self, name, **fixed):
+        """Return a function generating URLs for the named route
+        ``name``
+
+        The function takes the keyword arguments that change from call
+        to call, and returns the URL this generator returns for
+        ``name`` with both ``fixed`` and those arguments::
+
+            edit_url = url.bind('edit_entry', qualified=True)
+            for entry in entries:
+                edit_url(id=entry.id)
+
+        The route, the ``SCRIPT_NAME`` and the host and protocol of
+        qualified URLs are looked up once, when binding. Calls fall
+        back to the generator when they pass keys like ``anchor`` or
+        ``sub_domain``, or when the route can't use a URL builder.
+
+        """
+        def generic(**kargs):
+            args = fixed.copy()
+            args.update(kargs)
+            return self(name, **args)
+
+        mapper = self.mapper
+        environ = self.environ
+        script_name = environ.get('SCRIPT_NAME')
+        anchor = fixed.get('anchor')
+        host = fixed.get('host')
+        protocol = fixed.get('protocol')
+        qualified = fixed.get('qualified')
+        args = dict((key, value) for key, value in six.iteritems(fixed)
+                    if key not in _url_keys)
+        builder = mapper._url_builder(name)
+        if builder is None or script_name is None or \
+                not _special_keys.isdisjoint(args) or \
+                ('anchor' in fixed and not anchor) or \
+                ('host' in fixed and not host):
+            return generic
+
+        suffix = ''
+        if anchor is not None:
+            suffix = '#' + _url_quote(anchor, mapper.encoding)
+        base = None
+        if host or (protocol is not None) or qualified:
+            if 'routes.cached_hostinfo' not in environ:
+                cache_hostinfo(environ)
+            hostinfo = environ['routes.cached_hostinfo']
+            if not host and not qualified:
+                host = hostinfo['host'].split(':')[0]
+            elif not host:
+                host = hostinfo['host']
+            if protocol is None:
+                protocol = hostinfo['protocol']
+            if protocol != '':
+                protocol += ':'
+            if host[-1] != '/':
+                host += '/'
+            base = protocol + '//' + host
+        prefix = mapper.prefix
+        append_slash = mapper.append_slash
+        route = builder.route
+
+        def bound(**kargs):
+            if kargs and not _special_keys.isdisjoint(kargs):
+                return generic(**kargs)
+            newargs = args.copy()
+            newargs.update(kargs)
+            url = None
+            # remove_route() replaces the dict of route names
+            if mapper._routenames.get(name) is route:
+                url = builder(newargs, script_name, prefix, append_slash)
+            if url is None:
+                return generic(**kargs)
+            url += suffix
+            if base is not None:
+                url = base + url.lstrip('/')
+            if not ascii_characters(url):
+                raise GenerationException("Can only return a string, got "
+                                          "unicode instead: %s" % url)
+            return url
+        return bound
+
 
 def redirect_to(*args, **kargs):
     """Issues a redirect based on the arguments.
@@ -534,5 +642,7 @@ def as_unicode(value, encoding, errors='strict'):
 def ascii_characters(string):
     if string is None:
         return True
+    if isinstance(string, str) and hasattr(string, 'isascii'):
+        return string.isascii()
 
     return all(ord(c) < 128 for c in string)
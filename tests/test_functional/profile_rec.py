@@ -8,8 +8,11 @@ import os
 import time
 from routes import Mapper
 
-def get_mapper():
+def get_mapper(match_engine='prefix', regex_backend=None):
     m = Mapper()
+    m.match_engine = match_engine
+    if regex_backend is not None:
+        m.regex_backend = regex_backend
     m.connect('', controller='articles', action='index')
     m.connect('admin', controller='admin/general', action='index')
 
@@ -92,8 +95,162 @@ def do_profile(cmd, globals, locals, sort_order, callers):
     finally:
         os.remove(fn)
 
-def main(n=300):
+def bench_startup(routes=2000, lazy_regexps=False):
+    """Time creating the regexps of a large map plus its first
+    request"""
+    mapper = Mapper()
+    mapper.lazy_regexps = lazy_regexps
+    for x in range(routes):
+        mapper.connect('section%s/:year/:month/page/:page' % x,
+                       controller='articles', action='page%s' % x,
+                       requirements={'year': r'\d{4}'})
+    start = time.time()
+    mapper.create_regs([])
+    created = time.time()
+    mapper.match('/section%s/2004/12/page/2' % (routes // 2))
+    end = time.time()
+    print("Startup with %s routes, lazy_regexps=%s\n" % (routes, lazy_regexps))
+    print("%s ms to create the regexps" % ((created - start) * 1000))
+    print("%s ms to the end of the first request\n" % ((end - start) * 1000))
+
+def private_dirty_kb():
+    """Return the private dirty memory of this process in kB, Linux
+    only"""
+    with open('/proc/self/smaps_rollup') as smaps:
+        for line in smaps:
+            if line.startswith('Private_Dirty:'):
+                return int(line.split()[1])
+
+def bench_fork(routes=2000, freeze=False, workers=2):
+    """Fork workers from a large map, with or without Mapper.freeze(),
+    and report the memory each worker stops sharing with the parent
+    while serving requests"""
+    mapper = Mapper(explicit=False)
+    for x in range(routes):
+        mapper.connect('page%s' % x, 'section%s/:year/:month' % x,
+                       controller='articles', action='page%s' % x)
+    mapper.create_regs([])
+    if freeze:
+        mapper.freeze()
+    print("Fork with %s routes, freeze=%s\n" % (routes, freeze))
+    for worker in range(workers):
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            before = private_dirty_kb()
+            for x in range(0, routes, 10):
+                mapper.match('/section%s/2004/12' % x)
+                mapper.generate(controller='articles', action='page%s' % x,
+                                year=2004, month=12)
+            import gc
+            gc.collect()
+            os.write(write_end, str(private_dirty_kb() - before).encode())
+            os._exit(0)
+        os.close(write_end)
+        os.waitpid(pid, 0)
+        grown = os.read(read_end, 64).decode()
+        os.close(read_end)
+        print("worker %s: %s kB of private memory" % (worker, grown))
+    print('')
+
+def compare_backends(n=300, backends=('re', 'regex', 're2')):
+    """Run the recognition benchmark on the same map once per regexp
+    module, skipping the ones that aren't installed"""
+    for name in backends:
+        try:
+            backend = __import__(name)
+        except ImportError:
+            print("%s: not installed\n" % name)
+            continue
+        print("Backend: %s\n" % name)
+        bench_rec(get_mapper(regex_backend=backend), n)
+
+def bench_urlcache(pages=50, links=3000, size=1600, max_bytes=None):
+    """Render ``pages`` pages of ``links`` links each, half of them
+    shared by every page, and report the URL cache statistics"""
+    mapper = get_mapper()
+    mapper.urlcache_size = size
+    mapper.urlcache_bytes = max_bytes
+    generate = mapper.generate
+    start = time.time()
+    for page in range(pages):
+        for link in range(links):
+            article = link if link % 2 else page * links + link
+            # Templates don't agree on the keyword order
+            if (page + link) % 2:
+                generate(controller='articles', action='category',
+                         id=article)
+            else:
+                generate(id=article, action='category',
+                         controller='articles')
+    end = time.time()
+    stats = mapper.urlcache.stats()
+    print("URL cache with %s entries, max_bytes=%s\n" % (size, max_bytes))
+    print("%s us/url" % ((end - start) * 1000000 / (pages * links)))
+    print("%.1f%% hit rate" % (100.0 * stats['hits'] /
+                               (stats['hits'] + stats['misses'])))
+    print("%(evictions)s evictions, %(entries)s entries, "
+          "%(bytes)s bytes\n" % stats)
+
+def bench_gen_index(controllers=300, actions=8):
+    """Build the generation index of a map with many controllers that
+    each hardcode actions of their own, plus generic routes, and report
+    its build time and memory, Python 3 only"""
+    import tracemalloc
+    mapper = Mapper(explicit=False)
+    for x in range(controllers):
+        for y in range(actions):
+            mapper.connect('c%s/a%s/:id' % (x, y), controller='c%s' % x,
+                           action='c%sa%s' % (x, y))
+        mapper.connect('c%s/:action/:id' % x, controller='c%s' % x)
+    mapper.connect(':controller/:action/:id')
+    mapper.connect(':controller/:action')
+    mapper.create_regs([])
+    tracemalloc.start()
+    start = time.time()
+    mapper._create_gens()
+    end = time.time()
+    built = tracemalloc.get_traced_memory()[0]
+    for x in range(controllers):
+        for y in range(actions):
+            mapper.generate(controller='c%s' % x, action='c%sa%s' % (x, y),
+                            id=1)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("Generation index with %s controllers, %s actions\n" %
+          (controllers, actions))
+    print("%s ms to build, %s kB" % ((end - start) * 1000, built // 1024))
+    print("%s kB after generating every action" % (used // 1024))
+    print("%(exact)s exact, %(controller)s controller, %(action)s action, "
+          "%(wildcard)s wildcard routes, %(cached)s cached lists\n" %
+          mapper._tables.gen_index.stats())
+
+def bench_url_for(n=100000, builders=True, bound=False):
+    """Time URLGenerator calls naming a route, with or without the
+    compiled URL builders, or through a bound generator"""
+    from routes.util import URLGenerator
     mapper = get_mapper()
+    mapper.connect('entry', 'entries/:id', controller='articles',
+                   action='show')
+    if not builders:
+        mapper._build_url = lambda *args: None
+    url = URLGenerator(mapper, {'HTTP_HOST': 'example.com',
+                                'SCRIPT_NAME': ''})
+    start = time.time()
+    if bound:
+        entry_url = url.bind('entry')
+        for x in range(n):
+            entry_url(id=x % 1000)
+    else:
+        for x in range(n):
+            url('entry', id=x % 1000)
+    end = time.time()
+    print("URL generator with builders=%s, bound=%s\n" % (builders, bound))
+    print("%s us/url\n" % ((end - start) * 1000000 / n))
+
+def main(n=300, match_engine='prefix'):
+    mapper = get_mapper(match_engine)
     do_profile('bench_rec(mapper, %s)' % n, globals(), locals(),
                ('time', 'cumulative', 'calls'), None)
 
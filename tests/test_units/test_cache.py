@@ -0,0 +1,190 @@
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+from routes import Mapper
+from routes.mapper import LRUCache, ClockCache, _url_cache_key
+
+
+class TestClockCache(unittest.TestCase):
+    def test_evicts_entries_not_used_since_the_last_sweep(self):
+        cache = ClockCache(3)
+        for key in 'abc':
+            cache.put(key, key.upper())
+        assert cache.get('a', None) == 'A'
+        cache.put('d', 'D')
+        # 'a' was used, so it gets a second chance
+        assert cache.get('b', None) is None
+        assert [cache.get(key, None) for key in 'acd'] == ['A', 'C', 'D']
+        assert cache.hits == 4
+        assert cache.misses == 1
+        assert len(cache) == 3
+
+    def test_bounded(self):
+        cache = ClockCache(200)
+        for index in range(1000):
+            cache.put(index, index)
+            cache.get(index % 50, None)
+        assert len(cache) == 200
+        assert cache.get(999, None) == 999
+        assert cache.get(10, None) == 10
+
+    def test_put_replaces_value(self):
+        cache = ClockCache(2)
+        cache.put('a', 1)
+        cache.put('a', 2)
+        assert cache.get('a', None) == 2
+        assert len(cache) == 1
+
+    def test_clear(self):
+        cache = ClockCache(1000)
+        for index in range(100):
+            cache.put(index, index)
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.get(1, None) is None
+        cache.put(1, 1)
+        assert cache.get(1, None) == 1
+
+    def test_threads(self):
+        cache = ClockCache(256)
+        errors = []
+
+        def work(offset):
+            try:
+                for index in range(5000):
+                    key = (offset + index) % 400
+                    value = cache.get(key, None)
+                    if value is None:
+                        cache.put(key, str(key))
+                    else:
+                        assert value == str(key)
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=work, args=(offset,))
+                   for offset in range(0, 400, 50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert len(cache) == 256
+
+    def test_byte_budget(self):
+        url = '/articles/%d'
+        size = sys.getsizeof(b'key-10') + sys.getsizeof(url % 10)
+        cache = ClockCache(100, max_bytes=size * 5)
+        for index in range(10, 20):
+            cache.put(b'key-%d' % index, url % index)
+        assert len(cache) == 5
+        assert cache.bytes == size * 5
+        assert cache.evictions == 5
+        assert cache.get(b'key-19', None) == url % 19
+        cache.put(b'big', 'x' * size * 5)
+        assert cache.get(b'big', None) is None
+        assert cache.stats() == dict(hits=1, misses=1, evictions=5,
+                                     entries=5, bytes=size * 5)
+
+    def test_byte_budget_counts_the_key_items(self):
+        sizes = []
+        for payload in ('x', 'x' * 1000, 'x' * 10000):
+            cache = ClockCache(100)
+            cache.put(_url_cache_key('', (), dict(id=1, q=payload)), '/1')
+            sizes.append(cache.bytes)
+        assert sizes[1] - sizes[0] >= 999
+        assert sizes[2] - sizes[1] >= 9000
+
+    def test_ttl(self):
+        cache = ClockCache(2, ttl=0.05)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a', None) == 1
+        time.sleep(0.1)
+        assert cache.get('a', None) is None
+        # Expired entries get no second chance
+        cache.put('c', 3)
+        assert cache.evictions == 1
+        assert cache.get('c', None) == 3
+
+    def test_mapper_options(self):
+        m = Mapper(explicit=False)
+        m.connect('/{controller}/{action}/{id}')
+        m.urlcache_size = 10
+        m.urlcache_bytes = 4096
+        m.urlcache_ttl = 60
+        for index in range(3):
+            m.generate(controller='blog', action='view', id=1)
+        assert (m.urlcache.capacity, m.urlcache.max_bytes,
+                m.urlcache.ttl) == (10, 4096, 60)
+        assert m.urlcache.hits == 2
+        assert m.urlcache.misses == 1
+        assert m.urlcache.bytes > 0
+
+        m = Mapper(explicit=False)
+        m.connect('/{controller}/{action}/{id}')
+        m.urlcache_size = 0
+        m.generate(controller='blog', action='view', id=1)
+        assert m.urlcache is None
+
+    def test_mapper_options_with_a_table_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            for index in range(2):
+                m = Mapper(explicit=False)
+                m.table_cache = cache_dir
+                m.connect('/{controller}/{action}/{id}')
+                m.urlcache_size = 10
+                m.urlcache_bytes = 1000
+                m.create_regs(['blog'])
+                assert m.generate(controller='blog', action='view',
+                                  id=1) == '/blog/view/1'
+                assert (m.urlcache.capacity, m.urlcache.max_bytes) == \
+                    (10, 1000)
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_lru_cache_len(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        assert len(cache) == 1
+
+
+class TestURLCacheKey(unittest.TestCase):
+    def test_keyword_order(self):
+        assert _url_cache_key('', (), dict(id=1, action='x')) == \
+            _url_cache_key('', (), dict(action='x', id=1))
+
+    def test_types(self):
+        keys = set(_url_cache_key('', (), dict(id=value))
+                   for value in (1, True, 1.0, '1', None))
+        assert len(keys) == 5
+
+    def test_unhashable_values(self):
+        key = _url_cache_key('/app', (), dict(tags=['a', 'b']))
+        hash(key)
+        assert key == _url_cache_key('/app', (), dict(tags=['a', 'b']))
+        assert key != _url_cache_key('', (), dict(tags=['a', 'b']))
+
+    def test_generate_hits(self):
+        m = Mapper(explicit=False)
+        m.connect('/{controller}/{action}/{id}')
+        assert m.generate(controller='blog', action='view', id=1) == \
+            '/blog/view/1'
+        assert m.generate(id=1, action='view', controller='blog') == \
+            '/blog/view/1'
+        assert m.generate(controller='blog', action='view', id=True) == \
+            '/blog/view/True'
+        assert m.urlcache.hits == 1
+        environ = {'SCRIPT_NAME': '/app'}
+        for attempt in range(2):
+            assert m.generate(controller='blog', action='view', id=1,
+                              _environ=environ) == '/app/blog/view/1'
+        assert m.urlcache.hits == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
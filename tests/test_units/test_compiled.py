@@ -0,0 +1,131 @@
+import threading
+import unittest
+
+from routes import Mapper
+from routes.mapper import CompiledMapper
+from routes.util import RoutesException
+
+
+URLS = ['/', '/about', '/blog/2004', '/blog/recent', '/shop/3',
+        '/pages/view/3', '/missing/a/b/c']
+
+
+def make_map(engine='prefix', lazy=False):
+    m = Mapper(explicit=False)
+    m.match_engine = engine
+    m.lazy_regexps = lazy
+    m.match_cache_size = 10
+    m.miss_cache_size = 10
+    m.connect('home', '/', controller='home', action='index')
+    m.connect('about', '/about', controller='pages', action='about')
+    m.connect('archive', '/blog/{year}', controller='blog', action='archive',
+              requirements={'year': r'\d{4}'})
+    m.connect('/blog/{action}', controller='blog')
+    m.connect('/shop/{id}', controller='shop', action='view',
+              conditions=dict(method=['GET']))
+    m.connect('/shop/{id}', controller='shop', action='update',
+              conditions=dict(method=['PUT']))
+    m.connect('/{controller}/{action}/{id}')
+    m.create_regs(['blog', 'pages', 'shop'])
+    return m
+
+
+def snapshot_state(compiled):
+    tables = compiled._tables
+    sortcaches = dict(
+        (key, (list(keylist), dict(sortcache)))
+        for key, (keylist, sortcache) in tables.gen_index.cells.items())
+    return dict(tables.literal_routes), sortcaches
+
+
+class TestCompiledMapper(unittest.TestCase):
+    def test_same_results_as_the_mapper(self):
+        for engine in ('prefix', 'tree', 'combined'):
+            for lazy in (False, True):
+                m = make_map(engine, lazy)
+                compiled = m.compile()
+                assert isinstance(compiled, CompiledMapper)
+                for method in ('GET', 'PUT'):
+                    environ = {'REQUEST_METHOD': method}
+                    for url in URLS:
+                        m.environ = environ
+                        assert compiled.match(url, environ) == \
+                            m.match(url, environ)
+                        assert compiled.routematch(url, environ) == \
+                            m.routematch(url, environ)
+                assert compiled.generate(controller='blog', action='archive',
+                                         year=2004) == '/blog/2004'
+                assert compiled.generate(controller='pages', action='view',
+                                         id=3) == '/pages/view/3'
+                assert compiled.generate(
+                    controller='blog', action='recent',
+                    _environ={'SCRIPT_NAME': '/app'}) == '/app/blog/recent'
+
+    def test_tables_are_not_written_to(self):
+        compiled = make_map(lazy=True).compile()
+        tables = compiled._tables
+        assert tables.master_regexps is not None
+        before = snapshot_state(compiled)
+        for url in URLS:
+            compiled.match(url, {'REQUEST_METHOD': 'GET'})
+        compiled.generate(controller='blog', action='archive', year=2004)
+        compiled.generate(controller='blog', action='archive', year=2004,
+                          extra=1)
+        assert snapshot_state(compiled) == before
+
+    def test_mapper_changes_dont_reach_the_snapshot(self):
+        m = make_map()
+        compiled = m.compile()
+        m.remove_route('about')
+        m.connect('/archive/{id}', controller='blog', action='new')
+        assert compiled.match('/about') == {'controller': 'pages',
+                                            'action': 'about'}
+        assert compiled.match('/archive/3') is None
+        assert m.match('/about') is None
+        assert m.match('/archive/3')['id'] == '3'
+
+    def test_thread_local_environ_is_not_read(self):
+        m = make_map()
+        m.environ = {'SCRIPT_NAME': '/app', 'REQUEST_METHOD': 'PUT'}
+        compiled = m.compile()
+        assert compiled.generate(controller='blog', action='recent') == \
+            '/blog/recent'
+        assert compiled.match('/shop/3')['action'] == 'view'
+
+    def test_debug(self):
+        m = make_map()
+        m.debug = True
+        match, route, matchlog = m.compile().match('/blog/recent')
+        assert match['action'] == 'recent'
+        assert matchlog[-1]['route'] is route
+
+    def test_regexps_required(self):
+        m = Mapper(controller_scan=None)
+        m.connect('/{controller}')
+        self.assertRaises(RoutesException, m.compile)
+
+    def test_threads(self):
+        compiled = make_map().compile()
+        errors = []
+
+        def serve():
+            try:
+                for attempt in range(200):
+                    assert compiled.match('/blog/%d' % (1000 + attempt))[
+                        'year'] == str(1000 + attempt)
+                    assert compiled.generate(
+                        controller='pages', action='view',
+                        id=attempt) == '/pages/view/%d' % attempt
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=serve) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+
+
+if __name__ == '__main__':
+    unittest.main()
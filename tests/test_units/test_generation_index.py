@@ -0,0 +1,105 @@
+import unittest
+
+import six
+
+from routes import Mapper
+from routes.generation import GenerationIndex
+
+
+def make_map():
+    m = Mapper(explicit=False)
+    m.connect('/', controller='home', action='index')
+    m.connect('/blog/{action}/{id}', controller='blog')
+    m.connect('/{controller}/feed.{format}', action='feed')
+    m.connect('/blog/archive/{year}', controller='blog', action='archive')
+    m.connect('/{controller}/{action}/{id}')
+    m.connect('/wiki/{page}', controller='wiki', action='view')
+    m.connect('/{controller}/new', action='new')
+    m.connect('/blog/{id}', controller='blog', action='view')
+    m.connect('/users/{action}', controller='users')
+    m.connect('/{controller}/{action}')
+    return m
+
+
+def cross_product(routes):
+    """The generation hashes as they were built before the index"""
+    controllers = set()
+    actions = set()
+    for route in routes:
+        if 'controller' in route.defaults:
+            controllers.add(route.defaults['controller'])
+        if 'action' in route.defaults:
+            actions.add(route.defaults['action'])
+    gendict = {}
+    for route in routes:
+        clist = list(controllers) + ['*']
+        alist = list(actions) + ['*']
+        if 'controller' in route.hardcoded:
+            clist = [route.defaults['controller']]
+        if 'action' in route.hardcoded:
+            alist = [six.text_type(route.defaults['action'])]
+        for controller in clist:
+            for action in alist:
+                gendict.setdefault(controller, {}).setdefault(
+                    action, []).append(route)
+    return gendict
+
+
+def cross_product_routes(gendict, controller, action):
+    actionlist = gendict.get(controller) or gendict.get('*', {})
+    return actionlist.get(action) or actionlist.get('*', [])
+
+
+class TestGenerationIndex(unittest.TestCase):
+    def test_same_routes_as_the_cross_product(self):
+        m = make_map()
+        gen_index = GenerationIndex()
+        for route in m.matchlist:
+            gen_index.add(route)
+        gendict = cross_product(m.matchlist)
+        names = ['home', 'blog', 'wiki', 'users', 'other', None]
+        actions = ['index', 'feed', 'archive', 'view', 'new', 'edit', None]
+        for controller in names:
+            for action in actions:
+                keylist, sortcache = gen_index.lookup(controller, action)
+                assert keylist == cross_product_routes(
+                    gendict, controller, action), (controller, action)
+
+    def test_layers(self):
+        m = make_map()
+        m.create_regs(['blog'])
+        m.generate(controller='blog', action='view', id=3)
+        gen_index = m._tables.gen_index
+        assert gen_index.stats() == dict(exact=4, controller=2, action=2,
+                                         wildcard=2, cached=1)
+        # Only the wildcard layer has routes for these
+        assert gen_index.key('other', 'edit') == (None, None)
+        assert gen_index.key('blog', 'edit') == ('blog', None)
+        assert gen_index.key('other', 'new') == (None, 'new')
+        assert gen_index.lookup('other', 'edit') is \
+            gen_index.lookup('pages', 'show')
+
+    def test_connect_after_generating(self):
+        m = make_map()
+        m.create_regs(['blog'])
+        assert m.generate(controller='pages', action='show', id=3) == \
+            '/pages/show/3'
+        m.connect('/p/{id}', controller='pages', action='show')
+        keylist, sortcache = m._tables.gen_index.lookup('pages', 'show')
+        assert keylist[-1] is m.matchlist[-1]
+        # The generic route was connected first
+        assert m.generate(controller='pages', action='show', id=3) == \
+            '/pages/show/3'
+
+    def test_compiled_mapper_keeps_its_own_lists(self):
+        compiled = make_map().compile()
+        cells = dict(compiled._tables.gen_index.cells)
+        assert compiled.generate(controller='pages', action='show',
+                                 id=3) == '/pages/show/3'
+        assert compiled.generate(controller='blog', action='archive',
+                                 year=2004) == '/blog/archive/2004'
+        assert compiled._tables.gen_index.cells == cells
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import random
+import unittest
+
+from routes import Mapper
+
+
+ROUTES = [
+    ('/', dict(controller='home', action='index')),
+    ('/about', dict(controller='pages', action='about')),
+    ('/about/', dict(controller='pages', action='team')),
+    ('/blog', dict(controller='blog', action='index')),
+    ('/blog/{year}', dict(controller='blog', action='archive',
+                          requirements={'year': r'\d{4}'})),
+    ('/blog/{action}', dict(controller='blog')),
+    ('/blog/{id}.{format}', dict(controller='blog', action='show')),
+    ('/feeds/{id}', dict(controller='feeds', action='show')),
+    ('/feeds/latest', dict(controller='feeds', action='latest')),
+    ('/admin/{controller}/{action}', {}),
+    ('/shop/{id}', dict(controller='shop', action='view',
+                        conditions=dict(method=['GET']))),
+    ('/shop/{id}', dict(controller='shop', action='update',
+                        conditions=dict(method=['PUT']))),
+    ('/{controller}/{action}/{id}', {}),
+    ('/{controller}/{action}', dict(action='index')),
+    ('/files/{path:.*}', dict(controller='files', action='get')),
+]
+
+URLS = ['/', '/about', '/about/', '/blog', '/blog/', '/blog/2004',
+        '/blog/recent', '/blog/3.atom', '/feeds/latest', '/feeds/3',
+        '/admin/users/list', '/shop/3', '/pages/about', '/pages/about/',
+        '/wiki/view/3', '/wiki', '/files/a/b.txt', '/missing/a/b/c']
+
+GENERATE = [dict(controller='home', action='index'),
+            dict(controller='pages', action='team'),
+            dict(controller='blog', action='archive', year='2004'),
+            dict(controller='blog', action='recent'),
+            dict(controller='blog', action='show', id=3, format='atom'),
+            dict(controller='feeds', action='show', id=3),
+            dict(controller='users', action='list'),
+            dict(controller='shop', action='update', id=3),
+            dict(controller='wiki', action='view', id=3),
+            dict(controller='wiki', action='index'),
+            dict(controller='files', action='get', path='a/b.txt')]
+
+
+def make_map(routes, lazy):
+    m = Mapper(controller_scan=None, explicit=False)
+    m.lazy_regexps = lazy
+    m.minimization = True
+    for path, kwargs in routes:
+        m.connect(path, **kwargs)
+    return m
+
+
+def check(m, method):
+    m.environ = {'REQUEST_METHOD': method}
+    matches = [m.match(url) for url in URLS]
+    generated = [m.generate(**kwargs) for kwargs in GENERATE]
+    return matches, generated
+
+
+def gen_routes(m):
+    index = dict((id(route), i) for i, route in enumerate(m.matchlist))
+    gen_index = m._tables.gen_index
+    keys = set(gen_index.exact)
+    keys.update((c, a) for c in list(gen_index.controllers) + [None]
+                for a in list(gen_index.actions) + [None])
+    return dict((key, [index[id(r)] for r in gen_index.routes(key)])
+                for key in keys)
+
+
+def literal_routes(m):
+    index = dict((id(route), i) for i, route in enumerate(m.matchlist))
+    m.warmup()
+    return dict((key, [index[id(r)] for r in routes])
+                for key, routes in m._tables.literal_routes.items())
+
+
+class TestIncrementalRegistration(unittest.TestCase):
+    def test_route_connected_after_create_regs_matches(self):
+        m = Mapper(explicit=False)
+        m.connect('/about', controller='pages', action='about')
+        m.create_regs(['pages'])
+        assert m.match('/blog/3') is None
+        m.connect('/blog/{id}', controller='blog', action='view')
+        m.connect('/about', controller='pages', action='shadowed')
+        assert m.match('/blog/3') == {'controller': 'blog', 'action': 'view',
+                                      'id': '3'}
+        assert m.match('/about')['action'] == 'about'
+        assert m.generate(controller='blog', action='view', id=3) == \
+            '/blog/3'
+
+    def test_same_tables_as_a_full_build(self):
+        rand = random.Random(7)
+        for lazy in (False, True):
+            for attempt in range(40):
+                routes = ROUTES[:]
+                rand.shuffle(routes)
+                split = rand.randint(0, len(routes))
+                full = make_map(routes, lazy)
+                full.create_regs(['blog', 'pages', 'wiki', 'users'])
+                full.generate(controller='home', action='index')
+
+                incremental = make_map(routes[:split], lazy)
+                incremental.create_regs(['blog', 'pages', 'wiki', 'users'])
+                incremental.generate(controller='home', action='index')
+                for path, kwargs in routes[split:]:
+                    incremental.connect(path, **kwargs)
+
+                assert gen_routes(incremental) == gen_routes(full)
+                assert literal_routes(incremental) == literal_routes(full)
+                for method in ('GET', 'PUT'):
+                    assert check(incremental, method) == check(full, method)
+
+
+if __name__ == '__main__':
+    unittest.main()
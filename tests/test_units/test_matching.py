@@ -0,0 +1,613 @@
+import copy
+import pickle
+import re
+import unittest
+
+from routes import Mapper
+from routes import matching
+from routes.matching import PrefixIndex, SegmentTree
+from routes.util import RoutesException
+
+
+class LimitedRe(object):
+    """Compiles with re, refusing patterns with too many alternatives"""
+    error = re.error
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.patterns = []
+
+    def compile(self, pattern):
+        if self.limit is not None and pattern.count('|') >= self.limit:
+            raise OverflowError('regular expression code size limit')
+        self.patterns.append(pattern)
+        return re.compile(pattern)
+
+
+def make_map(engine):
+    m = Mapper(explicit=False)
+    m.minimization = True
+    m.match_engine = engine
+    m.connect('', controller='articles', action='index')
+    m.connect('admin', controller='admin/general', action='index')
+    m.connect('admin/comments/article/:article_id/:action/:id',
+              controller='admin/comments', action=None, id=None)
+    m.connect('admin/content/:action/:id', controller='admin/content')
+    m.connect('xml/:action/feed.xml', controller='xml')
+    m.connect('xml/articlerss/:id/feed.xml', controller='xml',
+              action='articlerss')
+    m.connect('index.rdf', controller='xml', action='rss')
+    m.connect('articles', controller='articles', action='index')
+    m.connect('articles/page/:page', controller='articles',
+              action='index', requirements={'page': r'\d+'})
+    m.connect('articles/:year/:month/:day/page/:page',
+              controller='articles', action='find_by_date', month=None,
+              day=None, requirements={'year': r'\d{4}'})
+    m.connect('pages/*name', controller='articles', action='view_page')
+    m.connect('art:thing', controller='art')
+    m.connect(':controller/:action/:id')
+    m.create_regs(['content', 'admin/why', 'admin/user'])
+    return m
+
+
+URLS = ['/', '/admin', '/admin/', '/admin/comments/article/4/view/2',
+        '/admin/content/edit/3', '/xml/1/feed.xml',
+        '/xml/articlerss/4/feed.xml', '/index.rdf', '/articles',
+        '/articles/page/2', '/articles/page/x', '/articles/2004/12/20/page/2',
+        '/pages/some/where', '/artwork', '/art', '/content/view/4',
+        '/admin/user/list', '/nowhere', '/nowhere/at/all/', '']
+
+
+class TestMatchEngines(unittest.TestCase):
+    def test_engines_agree(self):
+        prefix = make_map('prefix')
+        for engine in ('tree', 'combined'):
+            other = make_map(engine)
+            for url in URLS:
+                expected = prefix.routematch(url)
+                result = other.routematch(url)
+                if expected is None:
+                    assert result is None, (engine, url)
+                else:
+                    assert expected[0] == result[0], (engine, url)
+                    assert prefix.matchlist.index(expected[1]) == \
+                        other.matchlist.index(result[1]), (engine, url)
+
+    def test_tree_keeps_prefix_order(self):
+        for engine in ('prefix', 'tree', 'combined'):
+            m = Mapper()
+            m.match_engine = engine
+            m.connect('/{name}/b', action='dynamic')
+            m.connect('/x/b', action='static')
+            m.connect('/xy{name}', action='partial')
+            m.create_regs([])
+            assert m.match('/x/b') == {'action': 'static'}
+            assert m.match('/y/b') == {'action': 'dynamic', 'name': 'y'}
+            assert m.match('/xyz') == {'action': 'partial', 'name': 'z'}
+            assert m.match('/xyz/b') == {'action': 'dynamic', 'name': 'xyz'}
+
+    def test_trailing_newline(self):
+        # The trailing '$' of route regexps matches before a final
+        # newline, the first segment filters must let those URLs through
+        for engine in ('prefix', 'tree', 'combined'):
+            m = Mapper()
+            m.match_engine = engine
+            m.connect('/admin', action='admin')
+            m.connect('/pages/{id}', action='show')
+            m.create_regs([])
+            assert m.match('/admin\n') == {'action': 'admin'}
+            assert m.match('/pages/1\n') == {'action': 'show', 'id': '1'}
+            assert m.match('/admin\n\n') is None
+            m = make_map(engine)
+            for url in URLS:
+                url += '\n'
+                expected = None
+                for route in m.matchlist:
+                    expected = route.match(url)
+                    if expected:
+                        break
+                assert m.match(url) == (expected or None), (engine, url)
+
+    def test_unknown_engine(self):
+        m = Mapper()
+        m.match_engine = 'bogus'
+        m.connect('/hello', action='hi')
+        self.assertRaises(RoutesException, m.create_regs, [])
+
+
+def scan(m, url, environ):
+    """Match by trying every candidate of the full index in order"""
+    for route in m._tables.match_index.candidates(url):
+        match = route.match(url, environ, m.sub_domains,
+                            m.sub_domains_ignore, m.domain_match)
+        if match:
+            return match, route
+    return None
+
+
+class TestCombinedRegexp(unittest.TestCase):
+    def test_resumes_after_false_positive(self):
+        m = Mapper()
+        m.match_engine = 'combined'
+        m.connect('/{id}', action='never',
+                  conditions=dict(function=lambda environ, result: False))
+        m.connect('/{id}', action='never_either', requirements={'id': 'x'})
+        m.connect('/{id}', action='show')
+        m.connect('/{year}', action='year')
+        m.debug = True
+        m.create_regs([])
+        result, route, log = m.routematch('/4')
+        assert result == {'action': 'show', 'id': '4'}
+        assert [entry['regexp'] for entry in log] == [False, False, True]
+
+    def test_shards(self):
+        m = Mapper()
+        m.match_engine = 'combined'
+        for i in range(25):
+            m.connect('/page%d/{id}' % i, action='page%d' % i)
+        m.connect('/{a}/{b}', action='pair')
+        m.create_regs([])
+        m._tables.match_index.shard_size = 10
+        m._tables.match_index.compile()
+        assert len(m._tables.match_index.shards) == 3
+        assert m.match('/page24/3') == {'action': 'page24', 'id': '3'}
+        assert m.match('/page3/3') == {'action': 'page3', 'id': '3'}
+        assert m.match('/x/y') == {'action': 'pair', 'a': 'x', 'b': 'y'}
+        assert m.match('/page3/3/4') is None
+
+    def test_overflow_splits_shards(self):
+        m = Mapper()
+        m.match_engine = 'combined'
+        m.regex_backend = LimitedRe(4)
+        for i in range(12):
+            m.connect('/page%d/{id}' % i, action='page%d' % i)
+        m.create_regs([])
+        m._tables.match_index.compile()
+        assert len(m._tables.match_index.shards) == 4
+        for i in range(12):
+            assert m.match('/page%d/x' % i) == {'action': 'page%d' % i,
+                                                'id': 'x'}
+
+    def test_nested_groups(self):
+        m = Mapper()
+        m.match_engine = 'combined'
+        m.connect('/a/{id:(?P<num>[0-9]+)(x)?}', action='nested')
+        m.connect('/a/{slug}', action='slug')
+        m.create_regs([])
+        assert m.match('/a/12x') == {'action': 'nested', 'id': '12x',
+                                     'num': '12'}
+        assert m.match('/a/abc') == {'action': 'slug', 'slug': 'abc'}
+
+
+class TestMasterRegexps(unittest.TestCase):
+    def test_shards_by_first_segment(self):
+        m = Mapper()
+        m.master_shard_size = 2
+        for name in ('a', 'b', 'c'):
+            m.connect('/admin/%s/{id}' % name, action=name)
+        m.connect('/blog/{id}', action='blog')
+        m.connect('/{page}.html', action='page')
+        m.debug = True
+        m.create_regs([])
+        assert m.master_shards == [(None, 1), ('/admin', 2), ('/admin', 1),
+                                   ('/blog', 1)]
+        assert m.match('/admin/c/3')[0] == {'action': 'c', 'id': '3'}
+        assert m.match('/blog/3')[0] == {'action': 'blog', 'id': '3'}
+        assert m.match('/blog.html')[0] == {'action': 'page', 'page': 'blog'}
+        result, route, log = m.match('/admin/d/3')
+        assert result is None and log == []
+
+    def test_overflow_splits_shards(self):
+        master = matching.MasterRegexps(backend=LimitedRe(2))
+        for i in range(5):
+            master.add(None, '^/page%d$' % i)
+        master.compile()
+        assert master.stats() == [(None, 2), (None, 1), (None, 2)]
+        assert master.match('/page4')
+        assert not master.match('/page5')
+
+
+class TestRegexBackend(unittest.TestCase):
+    def test_backend_compiles_every_regexp(self):
+        for engine in ('prefix', 'combined'):
+            m = Mapper()
+            m.match_engine = engine
+            m.regex_backend = backend = LimitedRe()
+            m.connect('/pages/{id}', requirements={'id': r'\d+'})
+            m.connect('/pages/{id}/{page}')
+            m.create_regs([])
+            if engine == 'combined':
+                m._tables.match_index.compile()
+            else:
+                # The master regexp
+                assert any(pattern.startswith('(?:^/pages/(?:')
+                           for pattern in backend.patterns)
+            assert r'^\d+$' in backend.patterns
+            route = m.matchlist[0]
+            assert route.regexp in backend.patterns
+            assert route.req_regs['id'].pattern == r'^\d+$'
+            assert m.match('/pages/1') == {'id': '1'}
+            assert m.match('/pages/x/2') == {'id': 'x', 'page': '2'}
+            assert m.generate(id='x') is None
+
+    def test_backend_change_recompiles(self):
+        m = Mapper()
+        m.connect('/pages/{id}', requirements={'id': r'\d+'})
+        m.create_regs([])
+        m.regex_backend = backend = LimitedRe()
+        m.create_regs([])
+        assert m.matchlist[0]._regex_compile == backend.compile
+        assert r'^\d+$' in backend.patterns
+
+    def test_routes_can_be_pickled_and_copied(self):
+        for lazy in (False, True):
+            m = Mapper()
+            m.lazy_regexps = lazy
+            m.regex_backend = LimitedRe()
+            m.connect('/pages/{id}', action='show',
+                      requirements={'id': r'\d+'})
+            m.create_regs([])
+            route = m.matchlist[0]
+            for copied in (pickle.loads(pickle.dumps(route)),
+                           copy.deepcopy(route)):
+                assert copied.match('/pages/1') == \
+                    {'action': 'show', 'id': '1'}
+                assert copied.match('/pages/x') is False
+                assert copied.generate(action='show', id=2) == '/pages/2'
+                assert copied.req_regs['id'].pattern == r'^\d+$'
+
+
+class TestLazyRegexps(unittest.TestCase):
+    def test_routes_compile_on_first_use(self):
+        m = Mapper()
+        m.lazy_regexps = True
+        m.regex_backend = backend = LimitedRe()
+        m.connect('/pages/{id}', action='show')
+        m.connect('/users/{id}', action='user')
+        m.connect('/about', action='about')
+        m.create_regs([])
+        pages, users, about = m.matchlist
+        assert pages._regexp is not None
+        assert m.match('/pages/1') == {'action': 'show', 'id': '1'}
+        assert pages._regexp is None
+        assert users._regexp is not None
+        assert users.regexp not in backend.patterns
+        assert m.match('/about') == {'action': 'about'}
+        assert m._tables.literal_routes['/about'] == (about,)
+
+    def test_master_regexps_in_background(self):
+        m = Mapper()
+        m.lazy_regexps = True
+        m.connect('/pages/{id}', action='show')
+        m.create_regs([])
+        m._master_thread.join()
+        assert m.master_shards == [('/pages', 1)]
+        assert m.match('/pages/1') == {'action': 'show', 'id': '1'}
+        assert m.match('/pages/1/2') is None
+
+    def test_master_regexps_on_demand(self):
+        m = Mapper()
+        m.lazy_regexps = True
+        m.connect('/pages/{id}', action='show')
+        m.create_regs([])
+        m.build_master_regexps()
+        assert m.master_shards == [('/pages', 1)]
+
+    def test_stale_master_regexps_are_dropped(self):
+        m = Mapper()
+        m.lazy_regexps = True
+        m.connect('/pages/{id}', action='show')
+        m.create_regs([])
+        m._master_thread.join()
+        stale = m._tables.pending_master
+        m.connect('/users/{id}', action='user')
+        m.lazy_regexps = False
+        m.create_regs([])
+        m.build_master_regexps(stale)
+        assert m.master_shards == [('/pages', 1), ('/users', 1)]
+        assert m.match('/users/1') == {'action': 'user', 'id': '1'}
+
+
+class TestMethodIndexes(unittest.TestCase):
+    def test_resource_methods(self):
+        m = Mapper()
+        m.resource('message', 'messages')
+        m.connect('/messages/{id}/flag', controller='flags',
+                  conditions=dict(method='POST'))
+        m.create_regs(['messages', 'flags'])
+        assert sorted(m._tables.method_indexes) == \
+            ['DELETE', 'GET', 'POST', 'PUT']
+        urls = ['/messages', '/messages/1', '/messages/1/edit',
+                '/messages/new', '/messages/1/flag', '/messages.json']
+        for method in ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'OS']:
+            environ = {'REQUEST_METHOD': method}
+            for url in urls:
+                assert m.routematch(url, environ) == scan(m, url, environ), \
+                    (method, url)
+
+    def test_methods_are_filtered(self):
+        m = Mapper()
+        m.connect('/thing', action='get', conditions=dict(method=['GET']))
+        m.connect('/thing', action='put', conditions=dict(method=['PUT']))
+        m.connect('/thing', action='any')
+        m.create_regs([])
+        candidates = m._tables.method_indexes['PUT'].candidates('/thing')
+        assert [r.defaults['action'] for r in candidates] == ['put', 'any']
+        assert m.match('/thing', {'REQUEST_METHOD': 'PUT'}) == \
+            {'action': 'put'}
+        assert m.match('/thing', {'REQUEST_METHOD': 'PATCH'}) == \
+            {'action': 'any'}
+        assert m.match('/thing') == {'action': 'get'}
+
+
+class TestLiteralRoutes(unittest.TestCase):
+    def test_literal_lookup(self):
+        m = Mapper()
+        m.connect('/health', controller='status', action='health')
+        m.connect('/{controller}/{action}')
+        m.create_regs(['status'])
+        assert '/health' in m._tables.literal_routes
+        result = m.match('/health')
+        assert result == {'controller': 'status', 'action': 'health'}
+        result['action'] = 'changed'
+        assert m.match('/health') == {'controller': 'status',
+                                      'action': 'health'}
+        assert m.match('/health/') is None
+
+    def test_earlier_dynamic_route_wins(self):
+        m = Mapper()
+        m.connect('/admin{rest:.*}', controller='admin', action='dynamic',
+                  conditions=dict(method=['POST']))
+        m.connect('/admin', controller='admin', action='literal')
+        m.connect('/admin', controller='admin', action='fallback')
+        m.create_regs(['admin'])
+        assert len(m._tables.literal_routes['/admin']) == 3
+        post = {'REQUEST_METHOD': 'POST'}
+        get = {'REQUEST_METHOD': 'GET'}
+        assert m.match('/admin', environ=post)['action'] == 'dynamic'
+        assert m.match('/admin', environ=get)['action'] == 'literal'
+
+    def test_minimized_trailing_slash(self):
+        m = Mapper(explicit=False)
+        m.minimization = True
+        m.connect('hello/world', controller='content', action='index')
+        m.create_regs([])
+        assert m.match('/hello/world') == {'controller': 'content',
+                                           'action': 'index'}
+        assert m.match('/hello/world/') == {'controller': 'content',
+                                            'action': 'index'}
+        assert m.match('/hello') is None
+
+
+class TestMatchCache(unittest.TestCase):
+    def test_cache_hits(self):
+        m = Mapper()
+        m.match_cache_size = 10
+        m.connect('/thing/{id}', action='get',
+                  conditions=dict(method=['GET']))
+        m.connect('/thing/{id}', action='put',
+                  conditions=dict(method=['PUT']))
+        m.create_regs([])
+        get = {'REQUEST_METHOD': 'GET'}
+        put = {'REQUEST_METHOD': 'PUT'}
+        assert m.match('/thing/1', get) == {'action': 'get', 'id': '1'}
+        result = m.match('/thing/1', get)
+        assert result == {'action': 'get', 'id': '1'}
+        result['id'] = '2'
+        assert m.match('/thing/1', get) == {'action': 'get', 'id': '1'}
+        assert m.match('/thing/1', put) == {'action': 'put', 'id': '1'}
+        assert m.match_cache.hits == 2
+        assert m.match_cache.misses == 2
+
+    def test_cache_invalidation(self):
+        m = Mapper()
+        m.match_cache_size = 10
+        m.connect('/{id}', action='show')
+        m.create_regs([])
+        assert m.match('/1') == {'action': 'show', 'id': '1'}
+        m.connect('/1', action='one')
+        assert len(m.match_cache) == 0
+        m.create_regs([])
+        assert m.match('/1') == {'action': 'one'}
+
+    def test_function_conditions_not_cached(self):
+        allow = []
+        m = Mapper()
+        m.match_cache_size = 10
+        m.connect('/{id}', action='allowed',
+                  conditions=dict(function=lambda environ, result: allow))
+        m.connect('/{id}', action='show')
+        m.create_regs([])
+        assert m.match('/1') == {'action': 'show', 'id': '1'}
+        allow.append(True)
+        assert m.match('/1') == {'action': 'allowed', 'id': '1'}
+        assert len(m.match_cache) == 0
+
+    def test_sub_domains_in_key(self):
+        m = Mapper()
+        m.match_cache_size = 10
+        m.sub_domains = True
+        m.connect('/', action='sub', conditions=dict(sub_domain=True))
+        m.connect('/', action='main')
+        m.create_regs([])
+        sub = {'HTTP_HOST': 'fred.example.com'}
+        main = {'HTTP_HOST': 'example.com'}
+        for i in range(2):
+            assert m.match('/', sub) == {'action': 'sub',
+                                         'sub_domain': 'fred'}
+            assert m.match('/', main) == {'action': 'main',
+                                          'sub_domain': None}
+        assert m.match_cache.hits == 2
+
+
+class TestMissFilter(unittest.TestCase):
+    def test_first_segments(self):
+        m = Mapper()
+        m.connect('/blog/{id}', action='blog')
+        m.connect('/about', action='about')
+        m.connect('/page{id}.html', action='page')
+        m.create_regs([])
+        assert m._tables.first_segments == set(['/blog', '/about'])
+        assert m._tables.first_partials == ('/page',)
+        assert m.match('/blog/1') == {'action': 'blog', 'id': '1'}
+        assert m.match('/page1.html') == {'action': 'page', 'id': '1'}
+        assert m.match('/wp-admin/setup.php') is None
+        assert m.match('/blogs/1') is None
+
+        m.connect('/{controller}')
+        m.create_regs(['wp-admin'])
+        assert m._tables.first_segments is None
+        assert m.match('/wp-admin') == {'controller': 'wp-admin'}
+
+    def test_miss_cache(self):
+        m = Mapper()
+        m.miss_cache_size = 2
+        m.connect('/blog/{id}', action='blog')
+        m.create_regs([])
+        for i in range(2):
+            assert m.match('/blog/1/2') is None
+        assert m.miss_cache.hits == 1
+        m.match('/blog/1/3')
+        m.match('/blog/1/4')
+        assert len(m.miss_cache) == 2
+        m.connect('/blog/{id}/{page}', action='page')
+        assert len(m.miss_cache) == 0
+        m.create_regs([])
+        assert m.match('/blog/1/2') == {'action': 'page', 'id': '1',
+                                        'page': '2'}
+
+    def test_function_misses_not_cached(self):
+        allow = []
+        m = Mapper()
+        m.miss_cache_size = 10
+        m.connect('/{id}', action='allowed',
+                  conditions=dict(function=lambda environ, result: allow))
+        m.create_regs([])
+        assert m.match('/1') is None
+        allow.append(True)
+        assert m.match('/1') == {'action': 'allowed', 'id': '1'}
+
+
+BOUND_PATHS = ['/articles/{year}/{month}/{day}/page/{page}', '/{id}',
+               '/feeds/{id}.{format}', '/files/{path:.*}', '/x/*rest',
+               '/{controller}/{action}', '/pages/{id:[0-9]*}/edit',
+               '/a\\/b/{id}', '/static.html']
+BOUND_URLS = ['/', '/1', '/articles/2004/12/10/page/2', '/feeds/3',
+              '/feeds/3.atom', '/files/', '/files/a/b/c', '/x/', '/x/y/z',
+              '/admin/user/list', '/admin/list', '/pages//edit',
+              '/pages/3/edit', '/a\\/b/1', '/a/b/1', '/static.html',
+              '/static.html\n', '/1\n']
+
+
+class TestRouteBounds(unittest.TestCase):
+    def test_bounds(self):
+        m = Mapper()
+        m.connect('/articles/{year}/{month}/page/{page}')
+        m.connect('/files/{path:.*}')
+        m.connect('/feeds/{id}.{format}')
+        m.create_regs([])
+        articles, files, feeds = m.matchlist
+        assert (articles._min_segments, articles._max_segments,
+                articles._min_length) == (5, 5, 20)
+        assert (files._min_segments, files._min_length) == (2, 7)
+        assert files._max_segments > 1000
+        assert (feeds._min_segments, feeds._max_segments,
+                feeds._min_length) == (2, 2, 10)
+
+    def test_bounds_never_reject_a_match(self):
+        m = Mapper()
+        for path in BOUND_PATHS:
+            m.connect(path)
+        m.create_regs(['admin/user', 'admin', ''])
+        for route in m.matchlist:
+            for url in BOUND_URLS:
+                if route.regmatch.match(url):
+                    assert route._min_segments <= url.count('/') <= \
+                        route._max_segments, (route.routepath, url)
+                    assert len(url) >= route._min_length, \
+                        (route.routepath, url)
+
+    def test_debug_log(self):
+        m = Mapper()
+        m.connect('/blog/{id}/{page}', action='page')
+        m.connect('/blog/{id}', action='blog')
+        m.debug = True
+        m.create_regs([])
+        result, route, log = m.match('/blog/1')
+        assert result == {'action': 'blog', 'id': '1'}
+        assert log[0]['skipped'] == 'bounds'
+        assert log[1]['regexp']
+
+
+LITERAL_PATHS = BOUND_PATHS + ['/{controller}/{id}/edit', '/{id}.html',
+                               '/{a}-{b}/x']
+LITERAL_URLS = BOUND_URLS + ['/blog/3/edit', '/blog/3/edit/', '/3.html',
+                             '/3.html\n', '/1-2/x', '/1-2/y']
+
+
+class TestRequiredLiterals(unittest.TestCase):
+    def test_literals(self):
+        m = Mapper()
+        m.connect('/feeds/{id}.{format}')
+        m.connect('/{a}-{b}/x')
+        m.connect('/pages/{id}/edit/{page}')
+        m.create_regs([])
+        feeds, pair, pages = m.matchlist
+        assert feeds._required_suffixes is None
+        assert feeds._required_infixes == ('.',)
+        assert pair._required_suffixes == ('/x', '/x\n')
+        assert pair._required_infixes == ('-',)
+        assert pages._required_infixes == ('/edit/',)
+
+    def test_literals_never_reject_a_match(self):
+        for minimization in (False, True):
+            m = Mapper()
+            m.minimization = minimization
+            for path in LITERAL_PATHS:
+                m.connect(path)
+            m.create_regs(['admin/user', 'admin', 'blog', ''])
+            for route in m.matchlist:
+                for url in LITERAL_URLS:
+                    if route.regmatch.match(url):
+                        assert not route._lacks_literals(url), \
+                            (route.routepath, url)
+
+    def test_debug_log(self):
+        m = Mapper()
+        m.connect('/feeds/{id}.{format}', action='feed')
+        m.connect('/feeds/{id}', action='show')
+        m.debug = True
+        m.create_regs([])
+        result, route, log = m.match('/feeds/12345')
+        assert result == {'action': 'show', 'id': '12345'}
+        assert log[0]['skipped'] == 'literal'
+        assert log[1]['regexp']
+
+
+class TestSegmentTree(unittest.TestCase):
+    def test_candidates(self):
+        tree = SegmentTree()
+        tree.add('', 'root')
+        tree.add('/admin', 'admin')
+        tree.add('/admin/comm', 'comments')
+        tree.add('/ad', 'ad')
+        tree.add('/admin/comm', 'comments2')
+        assert list(tree.candidates('/admin/comments/3')) == \
+            ['comments', 'comments2', 'admin', 'ad', 'root']
+        assert list(tree.candidates('/admin')) == ['admin', 'ad', 'root']
+        assert list(tree.candidates('/a')) == ['root']
+
+    def test_same_order_as_prefix_index(self):
+        prefixes = ['', '/a', '/a/b', '/ab', '/a/bc', '/a/b/c', '/b']
+        tree = SegmentTree()
+        index = PrefixIndex()
+        for i, prefix in enumerate(prefixes):
+            tree.add(prefix, i)
+            index.add(prefix, i)
+        for url in ['/a/b/c/d', '/abc', '/a/bcd', '/b/a', '/', '/a/b']:
+            assert list(tree.candidates(url)) == \
+                list(index.candidates(url)), url
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import threading
+import unittest
+
+from routes import Mapper
+from routes.mapper import LRUCache
+from routes.util import RoutesException
+
+
+def make_map():
+    m = Mapper(explicit=False)
+    m.connect('home', '/', controller='home', action='index')
+    m.connect('acme', '/acme/{page}', controller='acme', action='page')
+    m.connect('about', '/about', controller='pages', action='about')
+    m.connect('/about', controller='pages', action='other')
+    m.connect('docs', 'http://docs.example.com', _static=True)
+    m.connect('/{controller}/{action}/{id}')
+    return m
+
+
+class TestRemoveRoute(unittest.TestCase):
+    def test_remove_by_name(self):
+        m = make_map()
+        m.create_regs(['acme', 'home', 'pages'])
+        assert m.match('/acme/help')['page'] == 'help'
+        assert m.generate(controller='acme', action='page',
+                          page='help') == '/acme/help'
+        m.remove_route('acme')
+        assert 'acme' not in m._routenames
+        assert m.match('/acme/help') is None
+        assert m.generate(controller='acme', action='page',
+                          id='help') == '/acme/page/help'
+        assert m.match('/acme/page/3')['id'] == '3'
+
+    def test_urlcache_set_by_the_application(self):
+        m = Mapper(explicit=False)
+        m.connect('a', '/a/{id}', controller='a', action='show')
+        m.urlcache = LRUCache(100)
+        m.create_regs([])
+        assert m.generate(controller='a', action='show', id=1) == '/a/1'
+        m.remove_route('a')
+        assert m.generate(controller='a', action='show', id=1) is None
+
+    def test_remove_route_object(self):
+        m = make_map()
+        m.create_regs(['pages'])
+        about = m._routenames['about']
+        assert m.match('/about')['action'] == 'about'
+        m.remove_route(about)
+        assert about not in m.matchlist
+        assert m.match('/about')['action'] == 'other'
+
+    def test_remove_before_tables_are_made(self):
+        m = make_map()
+        m.remove_route('acme')
+        m.create_regs(['acme'])
+        assert m.match('/acme/help') is None
+        assert m.generate(controller='home', action='index') == '/'
+
+    def test_remove_static_route(self):
+        m = make_map()
+        routes = list(m.matchlist)
+        m.remove_route('docs')
+        assert 'docs' not in m._routenames
+        assert m.matchlist == routes
+
+    def test_unknown_route(self):
+        m = make_map()
+        self.assertRaises(RoutesException, m.remove_route, 'missing')
+        other = make_map()
+        self.assertRaises(RoutesException, m.remove_route,
+                          other.matchlist[0])
+
+    def test_same_as_never_connected(self):
+        for lazy in (False, True):
+            for engine in ('prefix', 'tree', 'combined'):
+                m = make_map()
+                m.lazy_regexps = lazy
+                m.match_engine = engine
+                m.create_regs(['acme', 'home', 'pages'])
+                m.generate(controller='home', action='index')
+                m.remove_route('home')
+                m.remove_route('acme')
+                m.connect('/acme/{page}', controller='acme', action='new')
+                for url in ('/', '/acme/help', '/about', '/home/index/1'):
+                    assert m.match(url) == {
+                        '/': None,
+                        '/acme/help': {'controller': 'acme',
+                                       'action': 'new', 'page': 'help'},
+                        '/about': {'controller': 'pages',
+                                   'action': 'about'},
+                        '/home/index/1': {'controller': 'home',
+                                          'action': 'index', 'id': '1'},
+                    }[url]
+                assert m.generate(controller='home', action='index',
+                                  id=1) == '/home/index/1'
+
+    def test_old_tables_stay_usable(self):
+        m = make_map()
+        m.create_regs(['acme', 'home', 'pages'])
+        tables = m._tables
+        m.remove_route('acme')
+        assert m._tables is not tables
+        assert tables.literal_routes['/about'][0].name == 'about'
+        assert [route.name for route in
+                tables.match_index.candidates('/acme/help')][0] == 'acme'
+
+    def test_concurrent_matching(self):
+        m = Mapper(explicit=False)
+        m.connect('/{controller}/{action}')
+        for i in range(50):
+            m.connect('tenant%d' % i, '/t%d/{page}' % i,
+                      controller='tenant', action='page', tenant=i)
+        m.create_regs(['tenant'] + ['t%d' % i for i in range(50)])
+        errors = []
+
+        def serve():
+            try:
+                for attempt in range(20):
+                    for i in range(50):
+                        result = m.match('/t%d/home' % i)
+                        if result['controller'] == 'tenant':
+                            assert result['tenant'] == str(i)
+                        else:
+                            assert result['controller'] == 't%d' % i
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=serve) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for i in range(50):
+            m.remove_route('tenant%d' % i)
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert m.match('/t3/home') == {'controller': 't3',
+                                       'action': 'home'}
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+
+from routes import Mapper
+from routes import route as route_module
+from routes.route import Route
+
+
+class TestRouteData(unittest.TestCase):
+    def test_arbitrary_attributes(self):
+        route = Route(None, '/messages/{id}')
+        assert vars(route) == {}
+        route.my_attr = 1
+        assert vars(route) == {'my_attr': 1}
+        assert route.my_attr == 1
+        self.assertRaises(AttributeError, getattr, route, 'unknown')
+
+    def test_resource_routes_share_data(self):
+        m = Mapper()
+        m.resource('message', 'messages')
+        m.resource('comment', 'comments')
+        messages = [r for r in m.matchlist if 'messages' in r.routepath]
+        comments = [r for r in m.matchlist if 'comments' in r.routepath]
+        assert len(messages) == len(comments)
+        # The routes with and without a format share their key sets
+        hardcoded = [id(r.hardcoded) for r in messages]
+        assert len(set(hardcoded)) < len(hardcoded)
+
+    def test_identical_paths_keep_their_own_data(self):
+        m = Mapper()
+        m.connect('/pages/{id}', action='show')
+        m.connect('/pages/{id}', action='show')
+        show, show_again = m.matchlist
+        assert show.maxkeys is show_again.maxkeys
+        assert show.routelist == show_again.routelist
+        assert show.routelist is not show_again.routelist
+        assert show.routelist[1] is not show_again.routelist[1]
+        show.defaults['action'] = 'edit'
+        show.routelist.append('/x')
+        assert show_again.defaults['action'] == 'show'
+        assert show_again.routelist == ['/pages/', {'type': ':',
+                                                    'name': 'id'}]
+
+    def test_regexp_source_is_dropped(self):
+        m = Mapper()
+        m.connect('/pages/{id}')
+        m.create_regs([])
+        route = m.matchlist[0]
+        assert route._regexp is None
+        assert route.regexp == route.regmatch.pattern
+        m.lazy_regexps = True
+        m.create_regs([])
+        assert route._regexp == route.regexp
+        assert route.match('/pages/1') == {'id': '1'}
+        assert route._regexp is None
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class TestTemplates(unittest.TestCase):
+    def test_long_paths(self):
+        path = '/'.join('{part%d}' % i for i in range(3000))
+        for minimization in (False, True):
+            route = Route(None, path, _minimize=minimization)
+            route.makeregexp([])
+            url = '/'.join(str(i) for i in range(3000))
+            if minimization:
+                url = '/' + url
+            assert route.match(url)['part2999'] == '2999'
+
+    def test_parsed_paths_are_memoized(self):
+        first = Route(None, '/pages/{id:\\d+}/{action}')
+        second = Route(None, '/pages/{id:\\d+}/{action}')
+        assert first.routelist == second.routelist
+        assert first.routelist is not second.routelist
+        assert ('/pages/{id:\\d+}/{action}', False) in route_module._parsed_paths
+        assert first.reqs == second.reqs == {'id': '\\d+'}
+        assert first.reqs is not second.reqs
+
+    def test_regexps_depend_on_the_template(self):
+        plain = Route(None, '/pages/{id}', _minimize=True, _explicit=True)
+        required = Route(None, '/pages/{id}', _minimize=True,
+                         _explicit=True, requirements={'id': '\\d+'})
+        defaulted = Route(None, '/pages/{id}', _minimize=True,
+                          _explicit=True, id=None)
+        for route in (plain, required, defaulted):
+            route.makeregexp([])
+        assert len(set([plain.regexp, required.regexp,
+                        defaulted.regexp])) == 3
+        assert plain.match('/pages/x') == {'id': 'x'}
+        assert not required.match('/pages/x')
+        assert defaulted.match('/pages') == {'id': None}
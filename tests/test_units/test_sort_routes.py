@@ -0,0 +1,164 @@
+import random
+import unittest
+
+from routes import Mapper
+from routes import mapper as mapper_module
+from routes.mapper import _sort_routes
+
+
+def legacy_sort_routes(routes, keys):
+    """The comparator routes were sorted with before the key counts
+    were worked out once per route"""
+    keylist = [route for route in routes
+               if len(route.minkeys - route.dotkeys - keys) == 0]
+
+    class KeySorter:
+
+        def __init__(self, obj, *args):
+            self.obj = obj
+
+        def __lt__(self, other):
+            return self._keysort(self.obj, other.obj) < 0
+
+        def _keysort(self, a, b):
+            a = a.maxkeys
+            b = b.maxkeys
+
+            lendiffa = len(keys ^ a)
+            lendiffb = len(keys ^ b)
+            if lendiffa == 0 and lendiffb == 0:
+                return 0
+            if lendiffa == 0:
+                return -1
+            if lendiffb == 0:
+                return 1
+            if self._compare(lendiffa, lendiffb) != 0:
+                return self._compare(lendiffa, lendiffb)
+            if len(keys & b) == len(keys & a):
+                return self._compare(len(a), len(b))
+            else:
+                return self._compare(len(keys & b), len(keys & a))
+
+        def _compare(self, obj1, obj2):
+            if obj1 < obj2:
+                return -1
+            elif obj1 < obj2:
+                return 1
+            else:
+                return 0
+
+    keylist.sort(key=KeySorter)
+    return keylist
+
+
+class FakeRoute(object):
+    def __init__(self, maxkeys, required=()):
+        self.maxkeys = frozenset(maxkeys)
+        self.minkeys = self._required_keys = frozenset(required)
+        self.dotkeys = frozenset()
+
+
+class TestSortRoutes(unittest.TestCase):
+    def order(self, routes, *keys):
+        return [routes.index(route) for route in
+                _sort_routes(routes, frozenset(keys))]
+
+    def test_exact_match_first(self):
+        routes = [FakeRoute('ca'), FakeRoute('cai'), FakeRoute('caif')]
+        assert self.order(routes, 'c', 'a', 'i')[0] == 1
+        assert self.order(routes, 'c', 'a', 'i', 'f')[0] == 2
+        assert self.order(routes, 'c', 'a')[0] == 0
+
+    def test_connect_order_breaks_ties(self):
+        routes = [FakeRoute('cai'), FakeRoute('cai'), FakeRoute('caf')]
+        assert self.order(routes, 'c', 'a') == [0, 1, 2]
+        assert self.order(routes[::-1], 'c', 'a') == [0, 1, 2]
+
+    def test_required_keys_filter(self):
+        routes = [FakeRoute('cai', 'i'), FakeRoute('ca', 'ca'), FakeRoute('c')]
+        assert self.order(routes, 'c', 'a') == [1, 2]
+        assert self.order(routes, 'i') == [0, 2]
+
+    def test_same_order_as_the_legacy_comparator(self):
+        rand = random.Random(375)
+        for attempt in range(2000):
+            routes = [FakeRoute(rand.sample('abcdefg', rand.randint(0, 6)))
+                      for x in range(rand.randint(1, 12))]
+            keys = frozenset(rand.sample('abcdefg', rand.randint(0, 6)))
+            assert _sort_routes(routes, keys) == \
+                legacy_sort_routes(routes, keys)
+
+    def test_same_routes_generated_as_the_legacy_comparator(self):
+        rand = random.Random(375)
+        names = ['action', 'id', 'page', 'slug', 'format']
+        values = ['index', 'view', 'edit', '3']
+        for attempt in range(30):
+            m = Mapper(explicit=False)
+            m.minimization = bool(attempt % 2)
+            for x in range(8):
+                path = ''.join(
+                    '/{%s}' % name if rand.random() < 0.7 else '/%s' % name
+                    for name in rand.sample(names, rand.randint(1, 3)))
+                if rand.random() < 0.3:
+                    path += '.xml'
+                defaults = dict((name, rand.choice(values)) for name in
+                                rand.sample(names, rand.randint(0, 2)))
+                m.connect(path, controller='blog', **defaults)
+            m.urlcache = None
+            calls = [dict((name, rand.choice(values)) for name in
+                          rand.sample(names, rand.randint(1, 4)))
+                     for x in range(20)]
+            urls = [m.generate(controller='blog', **kargs)
+                    for kargs in calls]
+            original = mapper_module._sort_routes
+            mapper_module._sort_routes = legacy_sort_routes
+            try:
+                legacy = Mapper(explicit=False)
+                legacy.minimization = m.minimization
+                for route in m.matchlist:
+                    legacy.connect(route.routepath, **route._kargs)
+                legacy.urlcache = None
+                expected = [legacy.generate(controller='blog', **kargs)
+                            for kargs in calls]
+            finally:
+                mapper_module._sort_routes = original
+            assert urls == expected
+
+
+class TestSortCache(unittest.TestCase):
+    def test_bounded_and_keyed_by_key_set(self):
+        m = Mapper(explicit=False)
+        m.connect('/{controller}/{action}/{id}')
+        m.create_regs(['blog'])
+        size = mapper_module._sortcache_size
+        for i in range(size + 10):
+            m.generate(controller='blog', action='view', id=1,
+                       **{'extra%d' % i: 'x'})
+        keylist, sortcache = m._tables.gen_index.lookup('blog', 'view')
+        assert sortcache == {}
+        assert len(m._sortcache) == size
+        keys = frozenset(['controller', 'action', 'id',
+                          'extra%d' % (size + 9)])
+        assert m._sortcache.get((id(keylist), keys), None) == \
+            (keylist, keylist)
+
+    def test_warmed_orders_are_kept(self):
+        m = Mapper(explicit=False)
+        m.connect('entry', '/entries/{id}', controller='blog', action='view')
+        m.connect('/{controller}/{action}/{id}')
+        m.warmup()
+        keylist, sortcache = m._tables.gen_index.lookup('blog', 'view')
+        keys = frozenset(['controller', 'action', 'id'])
+        warmed = dict(sortcache)
+        assert keys in warmed
+        for i in range(mapper_module._sortcache_size + 10):
+            assert m.generate(controller='blog', action='view', id=1,
+                              **{'extra%d' % i: 'x'}) == \
+                '/entries/1?extra%d=x' % i
+        assert sortcache == warmed
+        assert m.generate(controller='blog', action='view', id=1) == \
+            '/entries/1'
+
+
+if __name__ == '__main__':
+    unittest.main()
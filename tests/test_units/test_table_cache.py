@@ -0,0 +1,141 @@
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from routes import Mapper
+from routes.route import Route
+
+
+class OtherRoute(Route):
+    pass
+
+
+unpickled = []
+
+
+def record_unpickling():
+    unpickled.append(True)
+
+
+class Unpickled(object):
+    def __reduce__(self):
+        return (record_unpickling, ())
+
+
+def make_map(cache_dir, extra=False):
+    m = Mapper(explicit=False)
+    m.table_cache = cache_dir
+    m.connect('home', '/', controller='home', action='index')
+    m.connect('/about', controller='pages', action='about')
+    m.connect('/{controller}/{action}/{id}')
+    m.connect('/archives/{year}', controller='blog', action='archive',
+              requirements={'year': r'\d{4}'})
+    if extra:
+        m.connect('/feeds/{id}.{format}', controller='feeds', action='show')
+    return m
+
+
+class TestTableCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_tables_are_saved_and_loaded(self):
+        m = make_map(self.cache_dir)
+        m.create_regs(['blog', 'pages'])
+        assert len(os.listdir(self.cache_dir)) == 1
+
+        loaded = make_map(self.cache_dir)
+
+        def makeregexp(*args, **kwargs):
+            raise AssertionError('regexp built again')
+        original, Route.makeregexp = Route.makeregexp, makeregexp
+        try:
+            loaded.create_regs(['blog', 'pages'])
+        finally:
+            Route.makeregexp = original
+        assert loaded._created_gens
+        assert [r.regexp for r in loaded.matchlist] == \
+            [r.regexp for r in m.matchlist]
+        assert loaded.master_shards == m.master_shards
+        assert loaded._tables.literal_routes['/about'] == \
+            (loaded.matchlist[1],)
+        for mapper in (m, loaded):
+            assert mapper.match('/about') == {'controller': 'pages',
+                                              'action': 'about'}
+            assert mapper.match('/archives/2004')['year'] == '2004'
+            assert mapper.match('/blog/view/3')['id'] == '3'
+            assert mapper.generate(controller='blog', action='archive',
+                                   year='2004') == '/archives/2004'
+            assert mapper.generate(controller='blog', action='view',
+                                   id=3) == '/blog/view/3'
+
+    def test_changes_rebuild_the_tables(self):
+        make_map(self.cache_dir).create_regs(['blog', 'pages'])
+        make_map(self.cache_dir).create_regs(['blog'])
+        m = make_map(self.cache_dir, extra=True)
+        m.create_regs(['blog'])
+        assert len(os.listdir(self.cache_dir)) == 3
+        assert m.match('/feeds/3.atom')['format'] == 'atom'
+
+    def test_unreadable_cache_is_ignored(self):
+        m = make_map(self.cache_dir)
+        m.create_regs(['blog'])
+        path = m._table_cache_path(['blog'])
+        with open(path, 'wb') as cache_file:
+            cache_file.write(b'not json')
+        m = make_map(self.cache_dir)
+        m.create_regs(['blog'])
+        assert m.match('/archives/2004')['year'] == '2004'
+
+    def test_unexpected_data_is_ignored(self):
+        m = make_map(self.cache_dir)
+        m.create_regs(['blog'])
+        path = m._table_cache_path(['blog'])
+        with open(path, 'rb') as cache_file:
+            saved = json.loads(cache_file.read().decode('utf-8'))
+        bad = [dict(saved, regexps=[[1, None]] * len(saved['regexps'])),
+               dict(saved, literal_routes={'/about': [99]}),
+               dict(saved, literal_routes={'/about': ['0']}),
+               dict(saved, literal_routes=[]),
+               dict(saved, version=None),
+               []]
+        for tables in bad:
+            with open(path, 'wb') as cache_file:
+                cache_file.write(json.dumps(tables).encode('utf-8'))
+            assert m._load_tables(path) is None, tables
+
+    def test_pickles_are_not_loaded(self):
+        m = make_map(self.cache_dir)
+        path = m._table_cache_path(['blog'])
+        with open(path, 'wb') as cache_file:
+            cache_file.write(pickle.dumps(Unpickled()))
+        m.create_regs(['blog'])
+        assert unpickled == []
+        assert m.match('/archives/2004')['year'] == '2004'
+
+    def test_route_class_is_part_of_the_key(self):
+        m = make_map(self.cache_dir)
+        other = make_map(self.cache_dir)
+        other.matchlist[0].__class__ = OtherRoute
+        assert m._table_cache_path(['blog']) != \
+            other._table_cache_path(['blog'])
+
+    def test_lazy_regexps(self):
+        m = make_map(self.cache_dir)
+        m.lazy_regexps = True
+        m.create_regs(['blog'])
+        loaded = make_map(self.cache_dir)
+        loaded.lazy_regexps = True
+        loaded.create_regs(['blog'])
+        assert loaded.match('/about')['action'] == 'about'
+        assert loaded.match('/blog/view/3')['id'] == '3'
+
+
+if __name__ == '__main__':
+    unittest.main()
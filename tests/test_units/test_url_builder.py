@@ -0,0 +1,171 @@
+import itertools
+import unittest
+
+from routes import Mapper
+from routes.generation import URLBuilder
+from routes.util import GenerationException, URLGenerator
+
+
+def make_map(explicit=False):
+    m = Mapper(explicit=explicit)
+    m.connect('entry', '/entries/{id}', controller='blog', action='view')
+    m.connect('feed', '/feeds/{id}{.format}', controller='feeds',
+              action='show')
+    m.connect('archive', '/archive/{year}', controller='blog',
+              action='archive', requirements={'year': r'\d{4}'})
+    m.connect('page', '/pages/{page}', controller='pages', action='list',
+              page=1)
+    m.connect('generic', '/{controller}/{action}/{id}')
+    m.connect('absolute', '/abs/{id}', controller='x', action='y',
+              _absolute=True)
+    m.connect('minimized', '/min/{id}', controller='x', action='min',
+              _minimize=True)
+    m.connect('static', 'http://example.com/{id}', _static=True)
+    m.connect('path', '/{id}{.format}/*url')
+    return m
+
+
+def generator(explicit, fast):
+    m = make_map(explicit)
+    if not fast:
+        m._build_url = lambda *args: None
+    url = URLGenerator(m, {'HTTP_HOST': 'example.com',
+                           'SCRIPT_NAME': '/app'})
+
+    def generate(*args, **kargs):
+        try:
+            return url(*args, **kargs)
+        except Exception as exc:
+            return type(exc)
+    return generate
+
+
+class TestURLBuilder(unittest.TestCase):
+    def test_builders_of_named_routes(self):
+        m = make_map()
+        m.create_regs(['blog'])
+        m.generate(controller='blog', action='view', id=1)
+        builders = m._tables.url_builders
+        assert isinstance(builders['entry'], URLBuilder)
+        assert builders['minimized'] is None
+        assert builders['static'] is None
+        assert builders['entry']({'id': 5}, '/app') == '/app/entries/5'
+
+        def generate(*args, **kargs):
+            raise AssertionError('generic path taken')
+        m.generate = generate
+        url = URLGenerator(m, {'SCRIPT_NAME': '/app'})
+        assert url('entry', id=5) == '/app/entries/5'
+        assert url('feed', id=5, format='atom', page=2) == \
+            '/app/feeds/5.atom?page=2'
+
+    def test_same_urls_as_the_generic_path(self):
+        values = [None, '', 0, 5, 'a b', u'\xe9', b'x', 2004, [1, 2],
+                  'blog']
+        keys = ['id', 'format', 'year', 'page', 'controller', 'q', 'url']
+        names = ['entry', 'feed', 'archive', 'page', 'generic', 'absolute',
+                 'minimized', 'path', 'missing']
+        for explicit in (False, True):
+            fast = generator(explicit, True)
+            generic = generator(explicit, False)
+            for name in names:
+                for key, other in itertools.combinations(keys, 2):
+                    for value in values:
+                        kargs = {key: value, other: 'x'}
+                        assert fast(name, **kargs) == \
+                            generic(name, **kargs), (name, kargs)
+
+    def test_mapper_options(self):
+        m = make_map()
+        m.prefix = '/pre'
+        m.append_slash = True
+        url = URLGenerator(m, {'SCRIPT_NAME': '/app'})
+        assert url('entry', id=5, q='a b') == '/app/pre/entries/5/?q=a+b'
+        assert url('absolute', id=5) == '/pre/abs/5/'
+
+    def test_special_keys_take_the_generic_path(self):
+        m = make_map()
+        m._build_url = None
+        url = URLGenerator(m, {'HTTP_HOST': 'example.com',
+                               'SCRIPT_NAME': ''})
+        assert url('entry', id=5, anchor='top') == '/entries/5#top'
+        assert url('entry', id=5, qualified=True) == \
+            'http://example.com/entries/5'
+
+    def test_missing_slots_are_checked_before_quoting(self):
+        m = make_map()
+        url = URLGenerator(m, {'SCRIPT_NAME': ''})
+        builder = m._url_builder('path')
+        assert builder({'id': 5, 'format': 3}) is None
+        assert builder({'id': 5, 'format': 3, 'url': 'x'}) is None
+        assert builder({'id': 5, 'format': 'xml', 'url': 'x'}) == \
+            '/5.xml/x'
+        self.assertRaises(GenerationException, url, 'path', id=5, format=3)
+
+    def test_connect_and_remove(self):
+        m = make_map()
+        url = URLGenerator(m, {'SCRIPT_NAME': ''})
+        assert url('entry', id=5) == '/entries/5'
+        m.connect('entry', '/e/{id}', controller='blog', action='view')
+        assert url('entry', id=5) == '/e/5'
+        m.remove_route('feed')
+        assert 'feed' not in m._tables.url_builders
+        assert url('entry', id=5) == '/e/5'
+
+
+class TestBind(unittest.TestCase):
+    def test_same_urls_as_the_generator(self):
+        fixeds = [{}, {'qualified': True}, {'host': 'other.com'},
+                  {'protocol': 'https'}, {'protocol': ''},
+                  {'anchor': 'top'}, {'anchor': ''}, {'format': 'atom'},
+                  {'id': 3, 'q': 'x'}, {'sub_domain': 'www'}]
+        calls = [{}, {'id': 5}, {'id': None}, {'id': 'a b', 'q': [1, 2]},
+                 {'year': '2004'}, {'year': 'x'}, {'page': 1},
+                 {'anchor': 'a'}, {'qualified': True}, {'controller': 'x'}]
+        names = ['entry', 'feed', 'archive', 'page', 'generic', 'absolute',
+                 'minimized', 'missing']
+        m = make_map()
+        environ = {'HTTP_HOST': 'example.com:8080', 'SCRIPT_NAME': '/app'}
+        url = URLGenerator(m, environ)
+        for name in names:
+            for fixed in fixeds:
+                bound = url.bind(name, **fixed)
+                for kargs in calls:
+                    args = fixed.copy()
+                    args.update(kargs)
+                    try:
+                        expected = url(name, **args)
+                    except Exception as exc:
+                        expected = type(exc)
+                    try:
+                        result = bound(**kargs)
+                    except Exception as exc:
+                        result = type(exc)
+                    assert result == expected, (name, fixed, kargs)
+
+    def test_resolved_once(self):
+        m = make_map()
+        environ = {'HTTP_HOST': 'example.com', 'SCRIPT_NAME': '/app'}
+        url = URLGenerator(m, environ)
+        bound = url.bind('entry', qualified=True)
+
+        def generate(*args, **kargs):
+            raise AssertionError('generic path taken')
+        m.generate = generate
+        assert bound(id=5) == 'http://example.com/app/entries/5'
+        assert bound(id=6, q='x') == 'http://example.com/app/entries/6?q=x'
+
+    def test_route_changes_after_binding(self):
+        m = Mapper(explicit=False)
+        m.connect('a', '/a/{id}', controller='blog', action='view')
+        url = URLGenerator(m, {'SCRIPT_NAME': ''})
+        bound = url.bind('a')
+        assert bound(id=1) == '/a/1'
+        m.remove_route('a')
+        assert bound(id=1) == url('a', id=1) == 'a?id=1'
+        m.connect('a', '/new/{id}', controller='blog', action='view')
+        assert bound(id=1) == url('a', id=1) == '/new/1'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import gc
+import unittest
+
+from routes import Mapper
+from routes.matching import CombinedRegexpIndex
+
+
+def make_map():
+    m = Mapper(explicit=False)
+    m.connect('home', '/', controller='home', action='index')
+    m.connect('article', '/articles/{year}/{slug}', controller='blog',
+              action='view')
+    m.connect('archive', '/articles/{year}', controller='blog',
+              action='view')
+    m.connect('/{controller}/{action}/{id}')
+    return m
+
+
+class TestWarmup(unittest.TestCase):
+    def test_builds_everything(self):
+        m = make_map()
+        m.controller_scan = ['blog', 'home']
+        m.lazy_regexps = True
+        m.warmup()
+        assert m._created_regs and m._created_gens
+        for route in m.matchlist:
+            assert route._regexp is None
+        assert m.master_shards
+        assert m._tables.literal_routes['/'] == (m.matchlist[0],)
+
+    def test_caches_named_route_keys(self):
+        m = make_map()
+        m.hardcode_names = False
+        m.create_regs(['blog'])
+        m.warmup()
+        keylist, sortcache = m._tables.gen_index.lookup('blog', 'view')
+        article = m._routenames['article']
+        assert [cached[0] for cached in sortcache.values()
+                if cached[0] is article]
+        entries = len(sortcache)
+        kargs = article.defaults.copy()
+        kargs.update(year='2004', slug='x')
+        assert m.generate(**kargs) == '/articles/2004/x'
+        assert len(sortcache) == entries
+
+    def test_combined_engine(self):
+        m = make_map()
+        m.match_engine = 'combined'
+        m.create_regs(['blog'])
+        m.warmup()
+        assert isinstance(m._tables.match_index, CombinedRegexpIndex)
+        assert m._tables.match_index.shards is not None
+
+    def test_freeze(self):
+        m = make_map()
+        m.create_regs(['blog'])
+        m.freeze(gc_freeze=False)
+        assert m._created_gens
+        if hasattr(gc, 'freeze'):
+            m.freeze()
+            try:
+                assert gc.get_freeze_count() > 0
+            finally:
+                gc.unfreeze()
+        assert m.match('/articles/2004/x')['slug'] == 'x'
+
+
+if __name__ == '__main__':
+    unittest.main()